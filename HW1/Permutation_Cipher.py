@@ -1,28 +1,111 @@
-def encrypt_permutation(plaintext, m, n):
-    # Remove spaces from plaintext
-    plaintext = plaintext.replace(" ", "")
+import heapq
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from functools import lru_cache
+from multiprocessing import Pool
 
-    # Print the matrix with rectangles side by side
-    # print("\nMatrix with rectangles:")
-    for row in range(m):
-        line = ""
-        for rect_start in range(0, len(plaintext), m * n):
-            for col in range(n):
-                char_idx = rect_start + row * n + col
-                if char_idx < len(plaintext):
-                    line += plaintext[char_idx] + " "
-        # print(line.rstrip())
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fitness"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "HW4"))
+from English_Fitness import HELD_OUT_PATH, encode, english_model
+from HW4_Code import Permutation
 
-    # Encrypt by reading down columns within each rectangle
-    ciphertext = ""
-    for rect_start in range(0, len(plaintext), m * n):
+
+@lru_cache(maxsize=256)
+def encryption_indices(m, n, length):
+    """
+    Gather indices for encrypting a text of the given length with m x n rectangles.
+    ciphertext[i] == plaintext[indices[i]]. A partial last rectangle is read down its
+    columns, skipping the cells that were never filled.
+    """
+    indices = array("q")
+    for rect_start in range(0, length, m * n):
         for col in range(n):
             for row in range(m):
                 char_idx = rect_start + row * n + col
-                if char_idx < len(plaintext):
-                    ciphertext += plaintext[char_idx]
+                if char_idx < length:
+                    indices.append(char_idx)
+    return indices
 
-    return ciphertext
+
+@lru_cache(maxsize=256)
+def decryption_indices(m, n, length):
+    """
+    Gather indices for decrypting a ciphertext of the given length with m x n rectangles.
+    plaintext[i] == ciphertext[indices[i]]. Like decrypt_permutation, characters that do
+    not fill a whole column or a whole rectangle are dropped.
+    """
+    row_width = length // m
+    rectangles_per_row = row_width // n
+    indices = array("q")
+    for rect in range(rectangles_per_row):
+        for row in range(m):
+            for col in range(rect * n, rect * n + n):
+                # The ciphertext fills the m x row_width matrix column by column
+                indices.append(col * m + row)
+    return indices
+
+
+def _gather(text, indices):
+    """Return the characters (or bytes) of text taken in the order given by indices."""
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        return bytes(map(text.__getitem__, indices))
+    return "".join(map(text.__getitem__, indices))
+
+
+def _batch_indices(index_fn, m, n, length, count):
+    """Tile the indices of one message so that count joined messages permute in one gather.
+
+    Only the single-message indices are cached (by index_fn); the tiled array grows with
+    the batch, so it is rebuilt per call rather than pinned in memory.
+    """
+    single = index_fn(m, n, length)
+    indices = array("q")
+    for k in range(count):
+        offset = k * length
+        indices.extend(i + offset for i in single)
+    return indices
+
+
+def _permute_batch(texts, m, n, index_fn):
+    texts = list(texts)
+    if not texts:
+        return []
+    length = len(texts[0])
+    if any(len(text) != length for text in texts):
+        raise ValueError("All messages in a batch must have the same length")
+
+    joiner = b"" if isinstance(texts[0], (bytes, bytearray)) else ""
+    joined = joiner.join(texts)
+    permuted = _gather(joined, _batch_indices(index_fn, m, n, length, len(texts)))
+
+    # Every message keeps the same output length, so the result splits evenly
+    out_length = len(permuted) // len(texts)
+    return [permuted[k * out_length : (k + 1) * out_length] for k in range(len(texts))]
+
+
+def encrypt_permutation(plaintext, m, n):
+    # Remove spaces from plaintext
+    plaintext = plaintext.replace(" ", "")
+
+    # Encrypt by reading down columns within each rectangle
+    return _gather(plaintext, encryption_indices(m, n, len(plaintext)))
+
+
+def encrypt_permutation_batch(plaintexts, m, n):
+    """
+    Encrypt many plaintexts of the same length (after removing spaces) in one gather.
+    Returns the ciphertexts in the same order.
+    """
+    return _permute_batch(
+        [plaintext.replace(" ", "") for plaintext in plaintexts],
+        m,
+        n,
+        encryption_indices,
+    )
 
 
 # Example usage
@@ -35,48 +118,143 @@ def encrypt_permutation(plaintext, m, n):
 # print(f"Ciphertext: {ciphertext}")
 
 
-def decrypt_permutation(ciphertext, m, n):
-    # Calculate dimensions
-    rectangle_width = n
-    num_rows = m
-    row_width = len(ciphertext) // num_rows
-    rectangles_per_row = row_width // rectangle_width
+def decrypt_permutation(ciphertext, m, n, verbose=True):
+    if verbose:
+        # The ciphertext fills an m x row_width matrix column-wise, so row r is every m-th char
+        row_width = len(ciphertext) // m
+        print("\nCharacter Matrix:")
+        for row in range(m):
+            print(" ".join(ciphertext[row : row_width * m : m]))
+
+    # Read the rectangles top-down, left-to-right to get plaintext
+    return _gather(ciphertext, decryption_indices(m, n, len(ciphertext)))
+
+
+def decrypt_permutation_batch(ciphertexts, m, n):
+    """
+    Decrypt many ciphertexts of the same length in one gather, without printing.
+    Returns the plaintexts in the same order.
+    """
+    return _permute_batch(ciphertexts, m, n, decryption_indices)
+
+
+def _permute_rectangles(src, dst, m, n, decrypt):
+    """
+    Permute every whole m x n rectangle of src into dst (both the same multiple of m*n
+    in length). Each cell moves with one strided slice covering all rectangles at once.
+    """
+    size = m * n
+    for col in range(n):
+        for row in range(m):
+            plain_pos = row * n + col
+            cipher_pos = col * m + row
+            if decrypt:
+                dst[plain_pos::size] = src[cipher_pos::size]
+            else:
+                dst[cipher_pos::size] = src[plain_pos::size]
+
+
+def _permute_stream(infile, outfile, m, n, decrypt, chunk_rectangles):
+    size = m * n
+    chunk_size = size * chunk_rectangles
+    # Reusable output buffer; only the last, shorter chunk gets a smaller one
+    out = bytearray(chunk_size)
+    pending = b""
+    written = 0
+
+    while True:
+        data = infile.read(chunk_size)
+        if not data:
+            break
+        if not decrypt:
+            data = data.replace(b" ", b"")
+        if pending:
+            data = pending + data
+        usable = len(data) - len(data) % size
+        pending = data[usable:]
+        if not usable:
+            continue
+
+        buffer = out if usable == chunk_size else bytearray(usable)
+        _permute_rectangles(data[:usable], buffer, m, n, decrypt)
+        outfile.write(buffer)
+        written += usable
+
+    if pending:
+        # Encryption reads the partial last rectangle down its columns;
+        # decryption drops it, like decrypt_permutation does
+        index_fn = decryption_indices if decrypt else encryption_indices
+        tail = _gather(pending, index_fn(m, n, len(pending)))
+        outfile.write(tail)
+        written += len(tail)
 
-    # 1. Create initial matrix and fill column-wise
-    matrix = []
-    for _ in range(num_rows):
-        matrix.append([""] * row_width)
+    return written
 
+
+def encrypt_permutation_stream(infile, outfile, m, n, chunk_rectangles=4096):
+    """
+    Encrypt a binary file object (or mmap) into outfile one chunk of whole m x n
+    rectangles at a time, so memory stays O(m*n) however large the input is.
+    Spaces are removed as in encrypt_permutation. Returns the number of bytes written.
+    """
+    return _permute_stream(infile, outfile, m, n, False, chunk_rectangles)
+
+
+def decrypt_permutation_stream(infile, outfile, m, n, chunk_rectangles=4096):
+    """
+    Decrypt a binary file object (or mmap) into outfile one chunk of whole m x n
+    rectangles at a time. Unlike decrypt_permutation the layout does not depend on the
+    total length, since every rectangle is independent. Returns the number of bytes written.
+    """
+    return _permute_stream(infile, outfile, m, n, True, chunk_rectangles)
+
+
+@lru_cache(maxsize=1024)
+def columnar_indices(key, length):
+    """
+    Gather indices for decrypting a keyed columnar transposition: the plaintext is
+    written in rows of len(key) columns and the columns are read out in the order
+    key[0], key[1], ... (the last row may be short). plaintext[i] == ciphertext[indices[i]].
+    With key = (0, 1, ..., n-1) and length = m*n this is one m x n rectangle. Results
+    are cached per (key, length), since annealing keeps revisiting keys near its optimum.
+    """
+    n = len(key)
+    rows = -(-length // n)
+    long_columns = length - (rows - 1) * n
+
+    # Column col of the plaintext (positions col, col + n, ...) is one contiguous run of
+    # the ciphertext, so each column is filled with a single strided slice assignment
+    indices = array("q", bytes(8 * length))
     pos = 0
-    for col in range(row_width):
-        for row in range(num_rows):
-            if pos < len(ciphertext):
-                matrix[row][col] = ciphertext[pos]
-                pos += 1
-
-    # Print character matrix
-    print("\nCharacter Matrix:")
-    for row in matrix:
-        print(" ".join(row))
-
-    # 2. Create rectangles matrix
-    rectangles = []
-    for rect_row in range(rectangles_per_row):
-        rectangle = []
-        start_col = rect_row * rectangle_width
-        for row in range(num_rows):
-            # Join the characters into a single string for each row
-            row_string = "".join(matrix[row][start_col : start_col + rectangle_width])
-            rectangle.append(row_string)
-        rectangles.append(rectangle)
-
-    # 3. Read rectangles top-down, left-to-right to get plaintext
-    plaintext = ""
-    for rect in rectangles:
-        for row in rect:
-            plaintext += row
-
-    return plaintext
+    for col in key:
+        size = rows if col < long_columns else rows - 1
+        indices[col::n] = array("q", range(pos, pos + size))
+        pos += size
+    return indices
+
+
+def encrypt_columnar(plaintext, key):
+    """Encrypt by writing rows of len(key) columns and reading the columns in key order."""
+    plaintext = plaintext.replace(" ", "")
+    return "".join(plaintext[col :: len(key)] for col in key)
+
+
+def decrypt_columnar(ciphertext, key):
+    return _gather(ciphertext, columnar_indices(tuple(key), len(ciphertext)))
+
+
+def rectangle_permutation(m, n, length):
+    """
+    The m x n rectangle transposition of a text of the given length (spaces removed) as a
+    Permutation: ciphertext == perm.apply(plaintext), and perm.inverse() decrypts. Rounds
+    combine into one gather: encrypting with p and then q is (p * q).apply(plaintext).
+    """
+    return Permutation(array("q", encryption_indices(m, n, length)), check=False)
+
+
+def columnar_permutation(key, length):
+    """The keyed columnar transposition as a Permutation, like rectangle_permutation."""
+    return Permutation(array("q", columnar_indices(tuple(key), length)), check=False).inverse()
 
 
 # Test cases
@@ -96,16 +274,32 @@ def test_permutation_cipher():
     print(f"Decrypted: {decrypted}")
     print(f"Successful decryption: {plaintext == decrypted}\n")
 
+    # Test case 2: Several messages of the same length in one batch
+    plaintexts = ["cryptographyisintriguing", "marymaryquitecontraryhow"]
 
-def find_possible_dimensions(ciphertext):
-    """
-    Find all possible m,n combinations that could have been used to encrypt the text.
-    Returns list of (m,n) tuples that produce readable results.
-    """
-    length = len(ciphertext)
-    possible_dims = []
+    print("Test Case 2:")
+    ciphertexts = encrypt_permutation_batch(plaintexts, m, n)
+    for ciphertext in ciphertexts:
+        print(f"Encrypted: {ciphertext}")
+
+    decrypted = decrypt_permutation_batch(ciphertexts, m, n)
+    print(f"Successful batch decryption: {plaintexts == decrypted}\n")
 
-    # Find all factor pairs of the length
+    # Test case 3: Several rounds collapsed into one permutation
+    rounds = [(3, 4), (4, 6), (2, 3)]
+    print("Test Case 3:")
+    ciphertext = plaintext
+    combined = Permutation.identity(len(plaintext))
+    for m, n in rounds:
+        ciphertext = encrypt_permutation(ciphertext, m, n)
+        combined = combined * rectangle_permutation(m, n, len(plaintext))
+    print(f"Rounds {rounds}: {ciphertext}")
+    print(f"One gather: {combined.apply(plaintext)}, cycle type {combined.cycle_type()}")
+    print(f"Successful combined decryption: {combined.inverse().apply(ciphertext) == plaintext}\n")
+
+
+def _dimension_candidates(length):
+    """Yield every (m, n) with m, n >= 2 such that the text fills whole m x n rectangles."""
     for m in range(2, length):
         if length % m == 0:
             # Calculate total width (n * num_rectangles)
@@ -113,13 +307,152 @@ def find_possible_dimensions(ciphertext):
             # Try all possible rectangle widths that evenly divide total_width
             for n in range(2, total_width + 1):
                 if total_width % n == 0:
-                    # Try decrypting with these dimensions
-                    decrypted = decrypt_permutation(ciphertext, m, n)
-                    possible_dims.append((m, n, decrypted))
+                    yield m, n
+
+
+def find_possible_dimensions(ciphertext):
+    """
+    Find all possible m,n combinations that could have been used to encrypt the text.
+    Returns list of (m,n) tuples that produce readable results.
+    """
+    possible_dims = []
+    for m, n in _dimension_candidates(len(ciphertext)):
+        # Try decrypting with these dimensions
+        decrypted = decrypt_permutation(ciphertext, m, n)
+        possible_dims.append((m, n, decrypted))
 
     return possible_dims
 
 
+_worker_ciphertext = None
+
+
+def _init_dimension_worker(ciphertext):
+    global _worker_ciphertext
+    _worker_ciphertext = ciphertext
+
+
+def _score_dimensions(dims):
+    m, n = dims
+    decrypted = decrypt_permutation(_worker_ciphertext, m, n, verbose=False)
+    model = english_model()
+    return model.score(decrypted), model.confidence(decrypted), m, n, decrypted
+
+
+def rank_possible_dimensions(ciphertext, top_k=5, min_confidence=None, processes=None):
+    """
+    Score the decryption for every possible m,n with the English quadgram model and
+    keep only the top_k best in a bounded heap. Candidates are spread over a process
+    pool (processes=1 runs them in this process). If min_confidence is given, the
+    search stops as soon as a decryption reaches that confidence (see
+    NgramModel.confidence; readable English usually lands around 0.6-1.0).
+    Returns a list of (score, confidence, m, n, decrypted), best first.
+    """
+    candidates = list(_dimension_candidates(len(ciphertext)))
+    # Build the model before forking so workers inherit it instead of retraining
+    english_model()
+
+    best = []
+    if processes == 1 or len(candidates) < 2:
+        _init_dimension_worker(ciphertext)
+        results = map(_score_dimensions, candidates)
+        pool = None
+    else:
+        processes = processes or os.cpu_count()
+        pool = Pool(processes, _init_dimension_worker, (ciphertext,))
+        chunksize = max(1, len(candidates) // (4 * processes))
+        results = pool.imap_unordered(_score_dimensions, candidates, chunksize)
+
+    try:
+        for result in results:
+            if len(best) < top_k:
+                heapq.heappush(best, result)
+            else:
+                heapq.heappushpop(best, result)
+            if min_confidence is not None and result[1] >= min_confidence:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    return sorted(best, reverse=True)
+
+
+def _anneal_columnar(args):
+    """One simulated-annealing run over column orders; returns (score, key, keys tried)."""
+    letters, n, iterations, temperature, seed = args
+    rng = random.Random(seed)
+    model = english_model()
+    length = len(letters)
+
+    def fitness(key):
+        return model.score(_gather(letters, columnar_indices(key, length)), encoded=True)
+
+    key = list(range(n))
+    rng.shuffle(key)
+    key = tuple(key)
+    score = fitness(key)
+    best_score, best_key = score, key
+
+    for i in range(iterations):
+        t = temperature * (1 - i / iterations)
+        child = list(key)
+        a, b = sorted(rng.sample(range(n), 2))
+        move = rng.random()
+        if move < 0.5:
+            # Swap two columns
+            child[a], child[b] = child[b], child[a]
+        elif move < 0.75:
+            # Reverse a run of columns
+            child[a : b + 1] = child[a : b + 1][::-1]
+        else:
+            # Move one column to another place
+            child.insert(b, child.pop(a))
+        child = tuple(child)
+
+        child_score = fitness(child)
+        delta = child_score - score
+        if delta >= 0 or (t > 0 and rng.random() < math.exp(delta / t)):
+            key, score = child, child_score
+            if score > best_score:
+                best_score, best_key = score, key
+
+    return best_score, best_key, iterations + 1
+
+
+def crack_columnar(
+    ciphertext, n, restarts=8, iterations=5000, temperature=None, seed=0, processes=None
+):
+    """
+    Recover the column order of a keyed columnar transposition with n columns by
+    simulated annealing under the English quadgram score. Each restart starts from a
+    random key seeded from (seed, restart), so results are reproducible; restarts run
+    in parallel on a process pool (processes=1 runs them here).
+    Returns (score, key, decrypted, keys_per_second).
+    """
+    letters = encode(ciphertext)
+    if temperature is None:
+        # Quadgram score differences grow with the text, so scale the start temperature
+        temperature = len(letters) / 50
+    english_model()
+
+    tasks = [
+        (letters, n, iterations, temperature, f"{seed}:{restart}")
+        for restart in range(restarts)
+    ]
+    start = time.perf_counter()
+    if processes == 1 or restarts < 2:
+        results = list(map(_anneal_columnar, tasks))
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(_anneal_columnar, tasks)
+    elapsed = time.perf_counter() - start
+
+    score, key, _ = max(results)
+    keys_tried = sum(result[2] for result in results)
+    return score, key, decrypt_columnar(ciphertext, key), keys_tried / elapsed
+
+
 def solve_problem_2b():
     ciphertext = "MYAMRARUYIQTENCTORAHROYWDSOYEOUARRGDERNOGW"
     print(f"\nTrying to decrypt: {ciphertext}")
@@ -133,6 +466,31 @@ def solve_problem_2b():
         print(f"Decrypted: {decrypted}")
 
 
+def solve_problem_2b_ranked():
+    ciphertext = "MYAMRARUYIQTENCTORAHROYWDSOYEOUARRGDERNOGW"
+    print(f"\nRanking decryptions of: {ciphertext}")
+
+    for score, confidence, m, n, decrypted in rank_possible_dimensions(ciphertext, top_k=3):
+        print(f"\nDimensions: {m}x{n} (score {score:.2f}, confidence {confidence:.2f})")
+        print(f"Decrypted: {decrypted}")
+
+
+def test_crack_columnar():
+    # Held-out text, which the fitness model was not trained on
+    with open(HELD_OUT_PATH, encoding="utf-8") as f:
+        plaintext = "".join(filter(str.isalpha, f.read())).lower()[:144]
+    key = (4, 0, 6, 2, 7, 1, 5, 3)
+    ciphertext = encrypt_columnar(plaintext, key)
+    print(f"\nCracking columnar transposition: {ciphertext}")
+
+    score, found_key, decrypted, keys_per_second = crack_columnar(ciphertext, len(key))
+    print(f"Key: {found_key} (actual {key})")
+    print(f"Score: {score:.2f}, {keys_per_second:.0f} keys/sec")
+    print(f"Decrypted: {decrypted}")
+
+
 if __name__ == "__main__":
     # test_permutation_cipher()
     solve_problem_2b()
+    # solve_problem_2b_ranked()
+    # test_crack_columnar()
@@ -1,6 +1,18 @@
+from array import array
 from collections import Counter
+from itertools import combinations, permutations
+from multiprocessing import Pool
+import heapq
+import os
+import random
 import string
 import math
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fitness"))
+from English_Fitness import ENGLISH_LETTER_FREQ, HELD_OUT_PATH, encode, english_model
+from Word_Patterns import pattern_of
 
 
 def clean_text(text):
@@ -19,51 +31,303 @@ def frequency_analysis(text):
     return dict(sorted(freq_percent.items(), key=lambda x: x[1], reverse=True))
 
 
-def analyze_common_letters(frequencies, text):
-    """Analyze possible matches for the most common letters."""
-    # Most common letters in English (in order)
-    english_common = ["E", "T", "A", "O", "I", "N"]
+class NgramCounts:
+    """
+    Unigram, bigram and trigram counts of a letter stream in flat arrays indexed in base 26
+    (bigram AB is at 0 * 26 + 1). firsts holds, per table, the position where each n-gram
+    first starts (-1 if it does not occur), which orders ties like frequency_analysis does.
+    head and tail hold the first and last two letters so that counts of neighbouring pieces
+    of a stream can be merged.
+    """
+
+    __slots__ = ("unigrams", "bigrams", "trigrams", "firsts", "length", "head", "tail")
+
+    def __init__(self):
+        self.unigrams = array("q", [0]) * 26
+        self.bigrams = array("q", [0]) * 26**2
+        self.trigrams = array("q", [0]) * 26**3
+        self.firsts = tuple(array("q", [-1]) * 26**n for n in (1, 2, 3))
+        self.length = 0
+        self.head = b""
+        self.tail = b""
+
+    def add_letters(self, letters):
+        """Count a piece of encoded letters (bytes 0-25) that directly follows what was counted so far."""
+        self.merge(_count_letters(letters))
+
+    def merge(self, other):
+        """Append the counts of the piece of stream that directly follows this one."""
+        for mine, theirs in (
+            (self.unigrams, other.unigrams),
+            (self.bigrams, other.bigrams),
+            (self.trigrams, other.trigrams),
+        ):
+            for i, c in enumerate(theirs):
+                if c:
+                    mine[i] += c
+        for mine, theirs in zip(self.firsts, other.firsts):
+            for i, p in enumerate(theirs):
+                if p >= 0 and mine[i] < 0:
+                    mine[i] = p + self.length
+
+        # n-grams that straddle the boundary start in our tail and end in their head
+        joined = self.tail + other.head
+        split = len(self.tail)
+        for n, table in ((2, self.bigrams), (3, self.trigrams)):
+            firsts = self.firsts[n - 1]
+            for start in range(max(0, split - n + 1), min(split, len(joined) - n + 1)):
+                idx = 0
+                for c in joined[start : start + n]:
+                    idx = idx * 26 + c
+                table[idx] += 1
+                if firsts[idx] < 0 or firsts[idx] > self.length - split + start:
+                    firsts[idx] = self.length - split + start
+
+        if self.length < 2:
+            self.head = (self.head + other.head)[:2]
+        self.tail = (self.tail + (other.tail if other.length >= 2 else other.head))[-2:]
+        self.length += other.length
+
+    def frequencies(self, n=1):
+        """
+        Percentages of the n-grams that occur, in the sorted dict shape of frequency_analysis:
+        most frequent first, with ties in order of first appearance.
+        """
+        table = (self.unigrams, self.bigrams, self.trigrams)[n - 1]
+        firsts = self.firsts[n - 1]
+        total = sum(table)
+        freq_percent = {}
+        for idx in sorted((i for i, c in enumerate(table) if c), key=lambda i: (-table[i], firsts[i])):
+            gram = ""
+            rest = idx
+            for _ in range(n):
+                rest, r = divmod(rest, 26)
+                gram = string.ascii_uppercase[r] + gram
+            freq_percent[gram] = (table[idx] / total) * 100
+        return freq_percent
+
+
+def _count_letters(letters):
+    """
+    Counts of one piece of encoded letters. Every overlapping 4-letter window is read as
+    a 32-bit value (four strided casts of the bytes) and counted in C, then the unigram,
+    bigram and trigram counts are taken from the first letters of each window.
+    """
+    counts = NgramCounts()
+    n = len(letters)
+    counts.length = n
+    counts.head = letters[:2]
+    counts.tail = letters[-2:]
+    unigrams, bigrams, trigrams = counts.unigrams, counts.bigrams, counts.trigrams
+    first_unigrams, first_bigrams, first_trigrams = counts.firsts
+
+    def first_seen(firsts, idx, p):
+        if firsts[idx] < 0 or firsts[idx] > p:
+            firsts[idx] = p
+
+    view = memoryview(letters)
+    for offset in range(4):
+        end = offset + max(0, n - offset) // 4 * 4
+        # A Counter lists windows in order of first appearance, so each one is found by
+        # searching on from where the previous one first started
+        p = offset - 4
+        for value, c in Counter(view[offset:end].cast("I")).items():
+            window = value.to_bytes(4, sys.byteorder)
+            p = letters.find(window, p + 4)
+            while (p - offset) % 4:
+                p = letters.find(window, p + 1)
+            a, b, d, _ = window
+            unigrams[a] += c
+            bigrams[a * 26 + b] += c
+            trigrams[(a * 26 + b) * 26 + d] += c
+            first_seen(first_unigrams, a, p)
+            first_seen(first_bigrams, a * 26 + b, p)
+            first_seen(first_trigrams, (a * 26 + b) * 26 + d, p)
+
+    # The last three letters start no full window
+    for p in range(max(0, n - 3), n):
+        unigrams[letters[p]] += 1
+        first_seen(first_unigrams, letters[p], p)
+        if p + 1 < n:
+            bigrams[letters[p] * 26 + letters[p + 1]] += 1
+            first_seen(first_bigrams, letters[p] * 26 + letters[p + 1], p)
+        if p + 2 < n:
+            trigrams[(letters[p] * 26 + letters[p + 1]) * 26 + letters[p + 2]] += 1
+            first_seen(first_trigrams, (letters[p] * 26 + letters[p + 1]) * 26 + letters[p + 2], p)
+    return counts
+
+
+def _count_file_range(args):
+    """Count the letters in bytes [start, end) of a file, reading chunk_size bytes at a time."""
+    path, start, end, chunk_size = args
+    counts = NgramCounts()
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            counts.add_letters(encode(data))
+    return counts
+
+
+def count_ngrams_file(path, chunk_size=1 << 22, processes=None):
+    """
+    Count unigrams, bigrams and trigrams of the letters in a file in one streaming pass.
+    Large files are split into byte ranges counted by worker processes, and the partial
+    counts are merged in order so n-grams across range boundaries are still counted.
+    Returns an NgramCounts; use .frequencies() for the dict that the analyzers take.
+    """
+    size = os.path.getsize(path)
+    workers = processes or os.cpu_count() or 1
+    workers = max(1, min(workers, size // chunk_size))
+    bounds = [size * i // workers for i in range(workers + 1)]
+    tasks = [(path, bounds[i], bounds[i + 1], chunk_size) for i in range(workers)]
+    if workers == 1:
+        parts = list(map(_count_file_range, tasks))
+    else:
+        with Pool(workers) as pool:
+            parts = pool.map(_count_file_range, tasks)
+
+    counts = NgramCounts()
+    for part in parts:
+        counts.merge(part)
+    return counts
 
-    # Get the three most common letters from our text
-    most_common = list(frequencies.items())[:3]
 
-    print("\nThree most common letters in ciphertext:")
+def key_from_mapping(mapping):
+    """Turn a {cipher letter: plain letter} dict into a 26-slot key with "*" for unmapped letters."""
+    return "".join(mapping.get(c, "*") for c in string.ascii_uppercase)
+
+
+def decode_table(key):
+    """
+    Precompiled bytes.translate table for a 26-slot key: key[i] is the plaintext letter for
+    chr(ord("A") + i), or "*" if unknown. Bytes other than A-Z are left unchanged.
+    """
+    table = bytearray(range(256))
+    table[ord("A") : ord("Z") + 1] = key.encode("ascii")
+    return bytes(table)
+
+
+def _ascii_letters(text):
+    """
+    text (str) as ASCII bytes for the decode tables. A key only maps A-Z, so any
+    non-ASCII letter (which clean_text keeps) is unknown and becomes "*".
+    """
+    if not text.isascii():
+        text = "".join(c if c.isascii() else "*" for c in text)
+    return text.encode("ascii")
+
+
+def decode_with_key(text, key):
+    """Decode text (str or bytes) with a 26-slot key, returning the same type."""
+    if isinstance(text, str):
+        return _ascii_letters(text).translate(decode_table(key)).decode("ascii")
+    return bytes(text).translate(decode_table(key))
+
+
+def decode_batch(text, keys):
+    """
+    Decode one text with many keys, converting the text to bytes only once. The decodes
+    are yielded one at a time, so only one of them is held in memory.
+    """
+    data = _ascii_letters(text) if isinstance(text, str) else bytes(text)
+    for key in keys:
+        decoded = data.translate(decode_table(key))
+        yield decoded.decode("ascii") if isinstance(text, str) else decoded
+
+
+def analyze_common_letters(frequencies, text, top=3):
+    """Analyze possible matches for the top most common letters."""
+    # Most common letters in English (in order), with their rounded percentages
+    english_common = ["E", "T", "A", "O", "I", "N", "S", "H", "R", "D", "L", "U"]
+    rank_freqs = [12.7, 9.1, 7.5, 7.0, 6.7, 6.3, 6.1, 6.0, 4.3, 4.0, 2.8, 2.8]
+    pool = english_common[: max(6, top)]
+
+    # Get the most common letters from our text
+    most_common = list(frequencies.items())[:top]
+    cipher_letters = [letter for letter, _ in most_common]
+
+    print(f"\nThe {top} most common letters in ciphertext:")
     for letter, freq in most_common:
         print(f"{letter}: {freq:.2f}%")
 
     print("\nPossible matches and resulting patterns:")
-    cipher_letters = [letter for letter, _ in most_common]
 
-    # Try each combination of English letters for our top 3
-    for e1 in english_common:
-        for e2 in english_common:
-            for e3 in english_common:
-                if len({e1, e2, e3}) == 3:  # Ensure no duplicates
-                    mapping = dict(zip(cipher_letters, [e1, e2, e3]))
-                    print(
-                        f"\nIf {cipher_letters[0]} → {e1}, {cipher_letters[1]} → {e2}, {cipher_letters[2]} → {e3}:"
-                    )
-                    print(
-                        f"Frequencies: {cipher_letters[0]}({frequencies[cipher_letters[0]]:.2f}%) = {e1}(12.7%), "
-                        + f"{cipher_letters[1]}({frequencies[cipher_letters[1]]:.2f}%) = {e2}(9.1%), "
-                        + f"{cipher_letters[2]}({frequencies[cipher_letters[2]]:.2f}%) = {e3}(7.5%)"
-                    )
-
-                    # Show partial decoding
-                    decoded = ""
-                    for c in text:
-                        if c in mapping:
-                            decoded += mapping[c]
-                        else:
-                            decoded += "*"
-                    print(f"Partial decode: {decoded}")
-
-
-def analyze_common_words(ciphertext, frequencies):
+    # Try each assignment of distinct English letters to our top letters,
+    # decoding the text once per assignment with a translate table
+    assignments = list(permutations(pool, len(cipher_letters)))
+    keys = [key_from_mapping(dict(zip(cipher_letters, plain))) for plain in assignments]
+    for plain, decoded in zip(assignments, decode_batch(text, keys)):
+        arrows = ", ".join(f"{c} → {p}" for c, p in zip(cipher_letters, plain))
+        matches = ", ".join(
+            f"{c}({frequencies[c]:.2f}%) = {p}({rank_freqs[i]}%)"
+            for i, (c, p) in enumerate(zip(cipher_letters, plain))
+        )
+        print(f"\nIf {arrows}:")
+        print(f"Frequencies: {matches}")
+
+        # Show partial decoding
+        print(f"Partial decode: {decoded}")
+
+
+class WordCandidate:
+    """
+    A partial substitution key built from common-word matches. key[i] is the plaintext
+    letter for cipher letter chr(ord("A") + i), or "*" if that letter is still unmapped.
+    """
+
+    __slots__ = ("key", "score", "sources", "found_words")
+
+    def __init__(self, key, score, sources):
+        self.key = key
+        self.score = score
+        self.sources = sources
+        self.found_words = None
+
+    @property
+    def word(self):
+        return self.sources[0][0]
+
+    def assignments(self):
+        return [(slot, plain) for slot, plain in enumerate(self.key) if plain != "*"]
+
+    def is_part_of(self, key):
+        """True if every assignment of this candidate is also made by key."""
+        return all(mine == "*" or mine == theirs for mine, theirs in zip(self.key, key))
+
+    def merge(self, other):
+        """
+        Combine two compatible candidates, or return None if they map a cipher letter to
+        two plain letters or two cipher letters to one plain letter.
+        """
+        merged = []
+        for mine, theirs in zip(self.key, other.key):
+            if mine == "*":
+                merged.append(theirs)
+            elif theirs == "*" or mine == theirs:
+                merged.append(mine)
+            else:
+                return None
+        assigned = [plain for plain in merged if plain != "*"]
+        if len(set(assigned)) != len(assigned):
+            return None
+        return WordCandidate(
+            "".join(merged), self.score + other.score, self.sources + other.sources
+        )
+
+
+def analyze_common_words(ciphertext, frequencies, index=None):
     """
     Attempts to find substitution mappings that produce common English words in the decoded text.
     For a list of common words (e.g., THE, AND, FOR, THAT, BUT, NOT, ARE, YOU, ALL, THIS, WILL),
-    slide over the ciphertext and generate a candidate mapping for each occurrence.
+    match every ciphertext window against the words with the same letter pattern and generate
+    a candidate mapping for each occurrence. If a word pattern index is given (e.g.
+    default_index()), the dictionary words it holds for each window's pattern are tried as
+    well; only the common words count as found words.
     Additionally, check if the candidate mapping results in more than one common word in the full decode.
     Also, attempt to merge candidate mappings if possible.
     """
@@ -117,130 +381,133 @@ def analyze_common_words(ciphertext, frequencies):
     ]
 
     # Expected letter frequencies for typical English text (in percentages)
-    expected_freqs = {
-        "A": 8.17,
-        "B": 1.49,
-        "C": 2.78,
-        "D": 4.25,
-        "E": 12.70,
-        "F": 2.23,
-        "G": 2.02,
-        "H": 6.09,
-        "I": 6.97,
-        "J": 0.15,
-        "K": 0.77,
-        "L": 4.03,
-        "M": 2.41,
-        "N": 6.75,
-        "O": 7.51,
-        "P": 1.93,
-        "Q": 0.10,
-        "R": 5.99,
-        "S": 6.33,
-        "T": 9.06,
-        "U": 2.76,
-        "V": 0.98,
-        "W": 2.36,
-        "X": 0.15,
-        "Y": 1.97,
-        "Z": 0.07,
-    }
+    expected_freqs = ENGLISH_LETTER_FREQ
     sigma = 3.0  # standard deviation for our frequency matching model
 
-    def partial_decode(text, mapping):
-        return "".join(mapping.get(c, "*") for c in text)
-
-    # List to hold candidate mappings.
-    # Each candidate is a dict with keys: "mapping", "score", "sources" (list of (word, position)),
-    # and "found_words" (set of common words found in the decoded message).
-    candidates = []
-    text_length = len(ciphertext)
+    # Candidate mappings are WordCandidate objects holding a 26-slot key. Their scores are
+    # log-likelihoods, so adding scores combines candidates without underflowing to 0.0.
+    # A substitution keeps word patterns (THAT -> ABCA), so each ciphertext window only
+    # needs to be tried against the words sharing its pattern. Computing the window
+    # pattern once replaces checking every word at every position. The index, if any, is
+    # asked once per distinct pattern and its other words join that pattern's class.
+    pattern_classes = {}
     for word in common_words:
-        word_len = len(word)
-        for i in range(text_length - word_len + 1):
-            substr = ciphertext[i : i + word_len]
-            mapping_candidate = {}
-            valid = True
-            # Build a candidate mapping from the ciphertext substring to the common word.
-            for j, cipher_char in enumerate(substr):
-                plain_char = word[j]
-                if cipher_char in mapping_candidate:
-                    if mapping_candidate[cipher_char] != plain_char:
-                        valid = False
-                        break
-                else:
-                    mapping_candidate[cipher_char] = plain_char
-            if not valid:
-                continue
-
-            # Compute a probability score based on frequency differences.
-            prob_score = 1.0
-            for cipher_char, plain_char in mapping_candidate.items():
-                obs_freq = frequencies.get(cipher_char, 0)
-                exp_freq = expected_freqs.get(
-                    plain_char, 5
-                )  # default if letter not in dict
-                likelihood = math.exp(-((obs_freq - exp_freq) ** 2) / (2 * sigma**2))
-                prob_score *= likelihood
-
-            # Decode the full ciphertext with this candidate mapping
-            decoded = partial_decode(ciphertext, mapping_candidate)
-            # Check which of the common words appear in the decoded text.
-            found = {cw for cw in common_words if cw in decoded}
-            candidate_info = {
-                "mapping": mapping_candidate,
-                "score": prob_score,
-                "sources": [(word, i)],
-                "found_words": found,
-            }
-            candidates.append(candidate_info)
-
-    # Helper function: merge two mapping candidates if they are compatible.
-    def merge_mappings(m1, m2):
-        merged = m1.copy()
-        for k, v in m2.items():
-            if k in merged and merged[k] != v:
-                return None
-            merged[k] = v
-        return merged
+        pattern_classes.setdefault(pattern_of(word), []).append(word)
+    positions = {word: [] for word in common_words}
+    dictionary_words = []
+    looked_up = set()
+    for word_len in sorted({len(word) for word in common_words}):
+        for i in range(len(ciphertext) - word_len + 1):
+            window = ciphertext[i : i + word_len]
+            if not window.isascii():
+                continue  # Keys only map A-Z
+            pattern = pattern_of(window)
+            if index is not None and pattern not in looked_up:
+                looked_up.add(pattern)
+                for word in index.words_for(pattern):
+                    if word not in positions:
+                        positions[word] = []
+                        dictionary_words.append(word)
+                        pattern_classes.setdefault(pattern, []).append(word)
+            for word in pattern_classes.get(pattern, ()):
+                positions[word].append(i)
 
-    # Filter candidates that (when applied) yield more than one common word.
-    valid_candidates = [c for c in candidates if len(c["found_words"]) > 1]
-
-    # Try combining candidate mappings pairwise.
-    combined_candidates = []
+    candidates = []
+    for word in common_words + dictionary_words:
+        for i in positions[word]:
+            key = ["*"] * 26
+            log_score = 0.0
+            # Build a candidate mapping from the ciphertext window to the common word,
+            # adding a log-likelihood term based on frequency differences per new letter.
+            for cipher_char, plain_char in zip(ciphertext[i : i + len(word)], word):
+                slot = ord(cipher_char) - ord("A")
+                if key[slot] == "*":
+                    key[slot] = plain_char
+                    obs_freq = frequencies.get(cipher_char, 0)
+                    exp_freq = expected_freqs.get(
+                        plain_char, 5
+                    )  # default if letter not in dict
+                    log_score -= (obs_freq - exp_freq) ** 2 / (2 * sigma**2)
+
+            candidates.append(WordCandidate("".join(key), log_score, [(word, i)]))
+
+    # Index the candidates by the exact set of cipher -> plain assignments they make.
+    # Candidate keys are one-to-one (windows match their word's pattern, and merge keeps
+    # that), so a common word shows up in a partial decode exactly when the key contains
+    # all the assignments of one of that word's candidates. The found words of a key are
+    # then the ones stored under the subsets of its assignments. No word has more than a
+    # few distinct letters, so only the small subsets need looking up, and nothing is
+    # decoded.
+    vocabulary = set(common_words)
+    by_assignments = {}
+    for candidate in candidates:
+        if candidate.word in vocabulary:
+            by_assignments.setdefault(frozenset(candidate.assignments()), set()).add(candidate.word)
+    largest = max(map(len, by_assignments), default=0)
+
+    def found_words(key):
+        assigned = [(slot, plain_char) for slot, plain_char in enumerate(key) if plain_char != "*"]
+        words = set()
+        for size in range(1, min(largest, len(assigned)) + 1):
+            for subset in combinations(assigned, size):
+                words |= by_assignments.get(frozenset(subset), set())
+        return words
+
+    # Keep only the best candidates that (when applied) yield more than one common word,
+    # in a bounded heap ordered by (score, -index) so that ties keep their original order.
+    shown = 15
+    valid_heap = []
+    for idx, candidate in enumerate(candidates):
+        candidate.found_words = found_words(candidate.key)
+        if len(candidate.found_words) > 1:
+            item = (candidate.score, -idx, candidate)
+            if len(valid_heap) < shown:
+                heapq.heappush(valid_heap, item)
+            elif item[:2] > valid_heap[0][:2]:
+                heapq.heapreplace(valid_heap, item)
+    valid_candidates = [item[2] for item in sorted(valid_heap, key=lambda x: x[:2], reverse=True)]
+
+    # Try combining candidate mappings pairwise, best combined score first. With the
+    # candidates ranked by score, pair (a, b) never scores below (a, b + 1) or, when
+    # b == a + 1, (a + 1, a + 2), so a heap over that frontier yields pairs in descending
+    # score order and we stop once enough of them have been accepted. Pairs with equal
+    # scores are taken as a group and ordered by candidate index, as a stable sort would.
     n = len(candidates)
-    for i in range(n):
-        for j in range(i + 1, n):
-            merged_mapping = merge_mappings(
-                candidates[i]["mapping"], candidates[j]["mapping"]
-            )
-            if merged_mapping is not None:
-                combined_score = candidates[i]["score"] * candidates[j]["score"]
-                combined_sources = candidates[i]["sources"] + candidates[j]["sources"]
-                decoded = partial_decode(ciphertext, merged_mapping)
-                combined_found = {cw for cw in common_words if cw in decoded}
+    order = sorted(range(n), key=lambda idx: -candidates[idx].score)
+    scores = [candidates[idx].score for idx in order]
+    frontier = [(-(scores[0] + scores[1]), 0, 1)] if n > 1 else []
+    combined_candidates = []
+    while frontier and len(combined_candidates) < shown:
+        level_score = frontier[0][0]
+        level = []
+        while frontier and frontier[0][0] == level_score:
+            _, a, b = heapq.heappop(frontier)
+            level.append(tuple(sorted((order[a], order[b]))))
+            if b + 1 < n:
+                heapq.heappush(frontier, (-(scores[a] + scores[b + 1]), a, b + 1))
+            if b == a + 1 and b + 1 < n:
+                heapq.heappush(frontier, (-(scores[b] + scores[b + 1]), b, b + 1))
+
+        for i, j in sorted(level):
+            merged = candidates[i].merge(candidates[j])
+            if merged is not None:
+                # Both source words always decode, so only pairs built from the same
+                # word (and no other found words) need the index lookup
+                combined_found = candidates[i].found_words | candidates[j].found_words
+                if len(combined_found) <= 1:
+                    combined_found = found_words(merged.key)
                 if len(combined_found) > 1:
-                    combined_candidates.append(
-                        {
-                            "mapping": merged_mapping,
-                            "score": combined_score,
-                            "sources": combined_sources,
-                            "found_words": combined_found,
-                        }
-                    )
-
-    # Sort candidates by probability score in descending order (higher score is more promising)
-    valid_candidates.sort(key=lambda x: x["score"], reverse=True)
-    combined_candidates.sort(key=lambda x: x["score"], reverse=True)
+                    merged.found_words = found_words(merged.key)
+                    combined_candidates.append(merged)
+    del combined_candidates[shown:]
 
     print("\nIndividual candidate mappings producing multiple common words:")
     if valid_candidates:
-        for candidate in valid_candidates[:15]:
-            decoded = partial_decode(ciphertext, candidate["mapping"])
-            print("\nFound mapping from sources:", candidate["sources"])
-            print("Probability Score: {:.6f}".format(candidate["score"]))
-            print("Common words found in decoded text:", candidate["found_words"])
+        for candidate in valid_candidates:
+            decoded = decode_with_key(ciphertext, candidate.key)
+            print("\nFound mapping from sources:", candidate.sources)
+            print("Log-Likelihood Score: {:.4f}".format(candidate.score))
+            print("Common words found in decoded text:", candidate.found_words)
             print("Partial decode: {}...".format(decoded[:100]))
     else:
         print("No individual candidate mapping resulted in more than one common word.")
@@ -249,11 +516,11 @@ def analyze_common_words(ciphertext, frequencies):
         "\nCombined candidate mappings (merged from pairs) producing multiple common words:"
     )
     if combined_candidates:
-        for candidate in combined_candidates[:15]:
-            decoded = partial_decode(ciphertext, candidate["mapping"])
-            print("\nCombined mapping from sources:", candidate["sources"])
-            print("Combined Probability Score: {:.6f}".format(candidate["score"]))
-            print("Common words found in decoded text:", candidate["found_words"])
+        for candidate in combined_candidates:
+            decoded = decode_with_key(ciphertext, candidate.key)
+            print("\nCombined mapping from sources:", candidate.sources)
+            print("Combined Log-Likelihood Score: {:.4f}".format(candidate.score))
+            print("Common words found in decoded text:", candidate.found_words)
             print("Partial decode: {}...".format(decoded[:100]))
     else:
         print(
@@ -261,6 +528,156 @@ def analyze_common_words(ciphertext, frequencies):
         )
 
 
+def _frequency_key(letters):
+    """
+    Starting key for the key search: the cipher letters, most frequent first (ties in
+    order of first appearance), go to the English letters in order of frequency.
+    """
+    english = sorted(range(26), key=lambda p: -ENGLISH_LETTER_FREQ[string.ascii_uppercase[p]])
+    cipher = [c for c, _ in Counter(letters).most_common()]
+    cipher += [c for c in range(26) if c not in cipher]
+    key = [0] * 26
+    for c, p in zip(cipher, english):
+        key[c] = p
+    return key
+
+
+def _search_substitution(args):
+    """
+    One restart of the key search over substitution keys. Returns (score, key) where
+    key[i] is the plaintext letter index for cipher letter i.
+    """
+    letters, temperature, plateau, kick, seed = args
+    rng = random.Random(seed)
+    table = english_model().log_probs[4]
+    length = len(letters)
+
+    # Per-letter position index: the positions of each cipher letter, and the start of
+    # every quadgram window that touches one of them. A swap of the plaintext letters of
+    # a and b only changes the windows that touch an a or a b, so only those are rescored.
+    positions = [[] for _ in range(26)]
+    for pos, c in enumerate(letters):
+        positions[c].append(pos)
+    windows = [
+        {start for pos in positions[c] for start in range(pos - 3, pos + 1) if 0 <= start < length - 3}
+        for c in range(26)
+    ]
+    present = [c for c in range(26) if positions[c]]
+    pairs = [(a, b) for a in present for b in range(26) if b != a and not (positions[b] and b < a)]
+    pair_windows = {(a, b): sorted(windows[a] | windows[b]) for a, b in pairs}
+
+    key = _frequency_key(letters)
+    plain = [key[c] for c in letters]
+
+    def windows_scores(starts):
+        p = plain
+        return [table[p[i] * 17576 + p[i + 1] * 676 + p[i + 2] * 26 + p[i + 3]] for i in starts]
+
+    def swap(a, b):
+        new_a, new_b = key[b], key[a]
+        for pos in positions[a]:
+            plain[pos] = new_a
+        for pos in positions[b]:
+            plain[pos] = new_b
+        key[a], key[b] = new_a, new_b
+
+    def set_key(new_key):
+        key[:] = new_key
+        plain[:] = [key[c] for c in letters]
+        scores[:] = windows_scores(range(length - 3))
+        return sum(scores)
+
+    scores = []
+    score = set_key(key[:])
+    best_score, best_key = float("-inf"), key[:]
+    current_score, current_key = score, key[:]
+    since_best = 0
+    while since_best < plateau:
+        # Climb to a local maximum: try every swap of two key letters, keeping those that
+        # raise the score, until a full pass over the pairs finds none
+        improved = True
+        while improved:
+            improved = False
+            for a, b in pairs:
+                starts = pair_windows[a, b]
+                swap(a, b)
+                new_scores = windows_scores(starts)
+                delta = sum(new_scores) - sum(map(scores.__getitem__, starts))
+                if delta > 1e-9:
+                    for i, s in zip(starts, new_scores):
+                        scores[i] = s
+                    score += delta
+                    improved = True
+                else:
+                    swap(a, b)
+
+        if score > best_score + 1e-9:
+            best_score, best_key = score, key[:]
+            since_best = 0
+        else:
+            since_best += 1
+
+        # Anneal over the local maxima: move to the new one if it scores higher, or with
+        # probability exp(delta / temperature) if not, then leave it with a few random
+        # swaps
+        delta = score - current_score
+        if delta >= 0 or rng.random() < math.exp(delta / temperature):
+            current_score, current_key = score, key[:]
+        set_key(current_key)
+        for _ in range(kick):
+            swap(*rng.choice(pairs))
+        score = set_key(key[:])
+
+    return best_score, best_key
+
+
+def solve_substitution(
+    ciphertext, restarts=4, temperature=3.0, plateau=30, kick=3, seed=0, processes=None
+):
+    """
+    Solve a monoalphabetic substitution by searching keys under the English quadgram
+    score. Each restart starts from the key that matches letter frequencies and climbs:
+    every swap of two key letters is tried, and kept if it raises the score, until none
+    does. It then anneals over these local maxima: it moves to each new one if it scores
+    higher, or with probability exp(delta / temperature) if not, and climbs again from it
+    after kick random swaps, until plateau climbs in a row have found nothing better than
+    the best so far. Restarts are seeded from (seed, restart) and run on a process pool
+    (processes=1 runs them here). Returns (score, key, plaintext), where key[i] is the
+    plaintext letter for cipher letter chr(ord("A") + i).
+
+    The result is the best key under the model, which is only the real key for the
+    letters the text holds enough evidence about: a cipher letter that occurs once or
+    twice can often be swapped with another rare letter at little cost.
+    """
+    letters = encode(ciphertext)
+    english_model()
+
+    tasks = [
+        (letters, temperature, plateau, kick, f"{seed}:{restart}") for restart in range(restarts)
+    ]
+    if processes == 1 or restarts < 2:
+        results = list(map(_search_substitution, tasks))
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(_search_substitution, tasks)
+
+    score, key = max(results)
+    key = "".join(string.ascii_uppercase[k] for k in key)
+    return score, key, decode_with_key(clean_text(ciphertext), key)
+
+
+def mark_uncertain(ciphertext, plaintext, min_count=4):
+    """
+    Lower-case the letters of plaintext whose cipher letter occurs fewer than min_count
+    times in ciphertext, which the quadgram score has too little evidence to place.
+    """
+    counts = Counter(ciphertext)
+    return "".join(
+        plain if counts[cipher] >= min_count else plain.lower()
+        for cipher, plain in zip(ciphertext, plaintext)
+    )
+
+
 def main():
     # The encrypted text (without spaces)
     ciphertext = (
@@ -289,6 +706,95 @@ def main():
     # New strategy: analyze for common words and compute mapping candidate scores with multi-word detection
     analyze_common_words(clean_ciphertext, frequencies)
 
+    # Automatic strategy: anneal over full keys with the quadgram fitness model. This
+    # finds the best key under the model, not necessarily the real one: letters whose
+    # cipher letter occurs only a few times are shown in lower case, as guesses
+    start = time.perf_counter()
+    score, key, plaintext = solve_substitution(clean_ciphertext)
+    elapsed = time.perf_counter() - start
+    print(f"\nAnnealing solver ({elapsed:.2f}s), best key under the quadgram model, score {score:.2f}:")
+    print(f"Key (cipher ABC...Z -> plain): {key}")
+    print(f"Decoded (lower case = rare cipher letter, unreliable): {mark_uncertain(clean_ciphertext, plaintext)}")
+
+
+def test_decode_with_key():
+    print("\nTesting key decoding:")
+    key = key_from_mapping({"X": "T", "Y": "H", "Z": "E"})
+    # clean_text keeps accented letters; no key maps them, so they decode to "*"
+    text = clean_text("xyz café XYZ")
+    print(f"{text} -> {decode_with_key(text, key)}")
+    print(f"Batch: {list(decode_batch(text, [key, key_from_mapping({'C': 'A'})]))}")
+
+    ciphertext = clean_text("AOFKWGOZLPOKLUQKLGDOBGKCLBQGHLIOCPLGDLWÉGLZZ")
+    frequencies = frequency_analysis(ciphertext)
+    analyze_common_letters(frequencies, ciphertext, top=1)
+
+
+def test_ngram_counts():
+    print("\nTesting n-gram count order:")
+    # H, E, W, R and D all occur once, so they keep the order they first appear in
+    counts = NgramCounts()
+    counts.add_letters(encode("HELLO"))
+    counts.add_letters(encode("WORLD"))
+    print(f"Unigrams: {list(counts.frequencies())}")
+    assert list(counts.frequencies()) == list(frequency_analysis("HELLOWORLD"))
+    assert list(counts.frequencies())[2:4] == ["H", "E"]
+    print(f"Bigrams: {list(counts.frequencies(2))}")
+
+
+def test_word_candidates():
+    print("\nTesting word candidate merging:")
+    the = WordCandidate(key_from_mapping({"X": "T", "Y": "H", "Z": "E"}), -1.0, [("THE", 0)])
+    and_ = WordCandidate(key_from_mapping({"A": "A", "B": "N", "C": "D"}), -2.0, [("AND", 5)])
+    she = WordCandidate(key_from_mapping({"Q": "S", "Y": "H", "W": "E"}), -1.5, [("SHE", 9)])
+    ha = WordCandidate(key_from_mapping({"Y": "H", "Z": "A"}), -0.5, [("HA", 3)])
+    merged = the.merge(and_)
+    print(f"THE + AND: {merged.sources}, score {merged.score}, key {merged.key}")
+    # Z -> E and W -> E would send two cipher letters to E, which no key can do
+    print(f"THE + SHE (Z and W both -> E): {the.merge(she)}")
+    # Z -> E and Z -> A would send one cipher letter to two plain letters
+    print(f"THE + HA (Z -> E and Z -> A): {the.merge(ha)}")
+
+
+def test_solve_substitution():
+    # Held-out text, which the fitness model was not trained on, under a random key
+    with open(HELD_OUT_PATH, encoding="utf-8") as f:
+        plaintext = clean_text(f.read())
+    rng = random.Random(2)
+    for length in (100, 200, 400):
+        key = "".join(rng.sample(string.ascii_uppercase, 26))
+        ciphertext = plaintext[:length].translate(str.maketrans(string.ascii_uppercase, key))
+        start = time.perf_counter()
+        score, _, decoded = solve_substitution(ciphertext)
+        elapsed = time.perf_counter() - start
+        correct = sum(map(str.__eq__, decoded, plaintext[:length]))
+        print(f"\n{length} letters ({elapsed:.2f}s): {correct}/{length} correct, score {score:.2f}")
+        print(f"Decoded: {decoded}")
+
+
+def test_solve_homework():
+    print("\nTesting the homework ciphertext:")
+    ciphertext = clean_text(
+        "AOFKWGOZLPOKLUQKLGDOBGKCLBQGHLIOCPLGDLWGLZZCPGDOGSKONQBPLMFPGHCGHLIOCP"
+        + "LGDLWGLZZCPGDOGSKONQBPIOBHLHLOGLB"
+    )
+    expected = "FAIRYTALESAREMORETHANTRUENOTBECAUSETHEYTELLUSTHATDRAGONSEXISTBUTBECAUSETHEYTELLUSTHATDRAGONSCANBEBEATEN"
+    _, _, decoded = solve_substitution(ciphertext)
+    marked = mark_uncertain(ciphertext, decoded)
+    correct = sum(map(str.__eq__, decoded, expected))
+    print(f"Decoded: {marked}")
+    print(f"Expected: {expected}")
+    print(f"{correct}/{len(expected)} correct")
+    # Every letter the model has enough evidence for decodes to the real plaintext
+    assert all(
+        plain == real for plain, real in zip(marked, expected) if plain.isupper()
+    ), marked
+
 
 if __name__ == "__main__":
     main()
+    test_decode_with_key()
+    test_ngram_counts()
+    test_word_candidates()
+    test_solve_homework()
+    test_solve_substitution()
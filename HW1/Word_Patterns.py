@@ -0,0 +1,259 @@
+"""
+Word-pattern dictionary index for crib-based substitution attacks.
+
+A word's pattern numbers its letters by first appearance, so THAT -> ABCA and
+THEN -> ABCD. A substitution cipher keeps patterns intact, which means a ciphertext word
+can only decrypt to dictionary words with the same pattern.
+
+The index is built once from a word list and saved in a compact binary file that is
+opened with mmap, so even a 100k+ word dictionary costs almost nothing to load:
+
+    header    b"WPAT", uint32 version, uint32 number of word lengths
+    lengths   per length: uint32 length, uint32 record count, uint64 records offset
+    records   per pattern, sorted: pattern (length bytes), uint64 words offset, uint32 count
+    words     uppercase words of each pattern class, back to back (each is length bytes)
+"""
+
+import mmap
+import os
+import re
+import string
+import struct
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fitness"))
+from English_Fitness import CORPUS_PATH
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "word_patterns.bin")
+
+_MAGIC = b"WPAT"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_LENGTH_ENTRY = struct.Struct("<IIQ")
+_RECORD_TAIL = struct.Struct("<QI")
+
+
+def pattern_of(word):
+    """Return the pattern of word as bytes, e.g. "THAT" -> b"\\x00\\x01\\x02\\x00"."""
+    first_seen = {}
+    return bytes(first_seen.setdefault(c, len(first_seen)) for c in word)
+
+
+def pattern_string(word):
+    """Readable form of the pattern, e.g. "THAT" -> "ABCA"."""
+    return "".join(string.ascii_uppercase[i] for i in pattern_of(word))
+
+
+def build_pattern_index(words, path=DEFAULT_INDEX_PATH):
+    """Group words by pattern and write the index file. Returns the number of words stored."""
+    classes = {}
+    for word in words:
+        word = word.strip().upper()
+        if word.isalpha() and word.isascii():
+            classes.setdefault(len(word), {}).setdefault(pattern_of(word), set()).add(word)
+
+    lengths = sorted(classes)
+    offset = _HEADER.size + _LENGTH_ENTRY.size * len(lengths)
+    length_entries = []
+    for length in lengths:
+        length_entries.append((length, len(classes[length]), offset))
+        offset += (length + _RECORD_TAIL.size) * len(classes[length])
+
+    records = bytearray()
+    words_blob = bytearray()
+    words_offset = offset
+    stored = 0
+    for length in lengths:
+        for pattern in sorted(classes[length]):
+            members = sorted(classes[length][pattern])
+            records += pattern + _RECORD_TAIL.pack(words_offset + len(words_blob), len(members))
+            for word in members:
+                words_blob += word.encode()
+            stored += len(members)
+
+    # Written under a temporary name and renamed over path, so an interrupted build never
+    # leaves a half-written index for later runs to map
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, len(lengths)))
+            for entry in length_entries:
+                f.write(_LENGTH_ENTRY.pack(*entry))
+            f.write(records)
+            f.write(words_blob)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return stored
+
+
+class PatternIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        """Open an index file written by build_pattern_index (memory-mapped, read-only)."""
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_lengths = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a word pattern index")
+        self._lengths = {}
+        for i in range(num_lengths):
+            length, count, offset = _LENGTH_ENTRY.unpack_from(
+                self._map, _HEADER.size + i * _LENGTH_ENTRY.size
+            )
+            self._lengths[length] = (count, offset)
+
+    def lengths(self):
+        return sorted(self._lengths)
+
+    def words_for(self, pattern):
+        """All dictionary words with the given pattern (bytes from pattern_of)."""
+        length = len(pattern)
+        if length not in self._lengths:
+            return []
+        count, offset = self._lengths[length]
+        record_size = length + _RECORD_TAIL.size
+
+        # Binary search over the sorted fixed-size records of this length
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = offset + mid * record_size
+            key = self._map[start : start + length]
+            if key < pattern:
+                lo = mid + 1
+            elif key > pattern:
+                hi = mid
+            else:
+                words_offset, num_words = _RECORD_TAIL.unpack_from(self._map, start + length)
+                blob = self._map[words_offset : words_offset + num_words * length].decode()
+                return [blob[k : k + length] for k in range(0, len(blob), length)]
+        return []
+
+    def candidates(self, cipher_word):
+        """Dictionary words that cipher_word could decrypt to."""
+        return self.words_for(pattern_of(cipher_word))
+
+    def close(self):
+        self._map.close()
+
+
+def default_index():
+    """
+    Open the default index, building it from the words of the fitness corpus if it is
+    missing or older than the corpus. Pass a real word list to build_pattern_index for
+    serious work.
+    """
+    if not os.path.exists(DEFAULT_INDEX_PATH) or os.path.getmtime(DEFAULT_INDEX_PATH) < os.path.getmtime(CORPUS_PATH):
+        with open(CORPUS_PATH, encoding="utf-8") as f:
+            build_pattern_index(re.findall(r"[A-Za-z]+", f.read()))
+    return PatternIndex()
+
+
+def _consistent(key, used, cipher_word, plain_word):
+    """Check cipher_word -> plain_word against a partial key, keeping the key one-to-one."""
+    for c, p in zip(cipher_word, plain_word):
+        slot = ord(c) - ord("A")
+        if key[slot] == "*":
+            if p in used:
+                return False
+        elif key[slot] != p:
+            return False
+    return True
+
+
+def solve_with_word_patterns(ciphertext, index, limit=5, max_unmatched=None):
+    """
+    Solve a substitution cipher whose word breaks are known (words separated by spaces)
+    by matching each cipher word against its pattern class and searching with constraint
+    propagation: after every assignment each remaining word keeps only the dictionary
+    words that still fit the partial key, and the search continues with the word that has
+    the fewest left.
+
+    Names and rare words may be missing from the dictionary, or their true reading may
+    clash with a wrong match elsewhere, so besides each of its candidates every word is
+    also tried unmatched, and a word whose candidates run out is dropped instead of
+    failing the branch. The number of unmatched words is raised from 0 until some key is
+    found (up to max_unmatched, default all of them).
+    Returns up to limit (unmatched words, partial key) pairs, where key[i] is the
+    plaintext letter for chr(ord("A") + i) or "*".
+    """
+    cipher_words = sorted(set(re.findall(r"[A-Z]+", ciphertext.upper())))
+    domains = {}
+    for cw in cipher_words:
+        words = index.candidates(cw)
+        if words:
+            domains[cw] = words
+    if max_unmatched is None:
+        max_unmatched = len(domains)
+
+    solutions = []
+
+    def search(key, used, remaining, unmatched, allowed):
+        if len(solutions) >= limit:
+            return
+        # Propagate: filter every remaining domain against the current key
+        filtered = {}
+        for cw, words in remaining.items():
+            fits = [w for w in words if _consistent(key, used, cw, w)]
+            if fits:
+                filtered[cw] = fits
+            elif unmatched < allowed:
+                unmatched += 1
+            else:
+                return
+        if not filtered:
+            solutions.append((unmatched, "".join(key)))
+            return
+
+        cw = min(filtered, key=lambda w: (len(filtered[w]), -len(w)))
+        rest = {w: d for w, d in filtered.items() if w != cw}
+        for plain_word in filtered[cw]:
+            new_key = key[:]
+            new_used = set(used)
+            for c, p in zip(cw, plain_word):
+                new_key[ord(c) - ord("A")] = p
+                new_used.add(p)
+            search(new_key, new_used, rest, unmatched, allowed)
+        if unmatched < allowed:
+            search(key, used, rest, unmatched + 1, allowed)
+
+    for allowed in range(max_unmatched + 1):
+        search(["*"] * 26, set(), domains, 0, allowed)
+        if solutions:
+            break
+    return solutions
+
+
+def test_word_patterns():
+    index = default_index()
+    print("Testing word pattern index:")
+    for word in ["THAT", "PEOPLE", "LETTER"]:
+        words = index.words_for(pattern_of(word))
+        print(f"{word} ({pattern_string(word)}): {len(words)} words, e.g. {words[:6]}")
+
+    plaintext = "THE QUICK SOLUTION IS TO MATCH EACH WORD AGAINST THE WORDS WITH THE SAME PATTERN"
+    key = "QWERTYUIOPASDFGHJKLZXCVBNM"
+    ciphertext = plaintext.translate(str.maketrans(string.ascii_uppercase, key))
+    print(f"\nCiphertext: {ciphertext}")
+    for unmatched, solution in solve_with_word_patterns(ciphertext, index, limit=3):
+        decoded = ciphertext.translate(str.maketrans(string.ascii_uppercase, solution))
+        print(f"Decoded ({unmatched} words unmatched): {decoded}")
+
+    # GRUFFALO is not in the dictionary, but a dictionary word of its pattern is, so its
+    # domain never runs out: the true key is only reached by leaving it unmatched
+    plaintext = "HE SAID THAT GRUFFALO WAS HERE"
+    ciphertext = plaintext.translate(str.maketrans(string.ascii_uppercase, key))
+    solutions = solve_with_word_patterns(ciphertext, index, limit=50)
+    decodes = [
+        ciphertext.translate(str.maketrans(string.ascii_uppercase, solution))
+        for _, solution in solutions
+    ]
+    true_readings = [d for d in decodes if all(c in ("*", p) for c, p in zip(d, plaintext))]
+    print(f"\nCiphertext: {ciphertext}")
+    print(f"{len(solutions)} keys with {solutions[0][0]} word unmatched, true reading among them: {true_readings}")
+
+
+if __name__ == "__main__":
+    test_word_patterns()
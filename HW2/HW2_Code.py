@@ -1,9 +1,70 @@
+from collections import Counter, deque
+from collections.abc import Iterator
+from functools import lru_cache, reduce
+from itertools import (
+    chain,
+    combinations,
+    compress,
+    groupby,
+    islice,
+    permutations,
+    product,
+)
+from multiprocessing import Pool
+from operator import mul, ne
+from typing import BinaryIO, Callable
+import heapq
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fitness"))
+from English_Fitness import (
+    CORPUS_PATH,
+    ENGLISH_LETTER_FREQ,
+    HELD_OUT_PATH,
+    encode_batch,
+    english_model,
+    quadgram_scores,
+)
+
+_UPPER = b"ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LOWER = b"abcdefghijklmnopqrstuvwxyz"
+# bytes.translate tables that shift A-Z and a-z forward by 0-25, keeping case
+_SHIFT_TABLES = [
+    bytes.maketrans(_UPPER + _LOWER, _UPPER[s:] + _UPPER[:s] + _LOWER[s:] + _LOWER[:s])
+    for s in range(26)
+]
+_TO_UPPER = bytes.maketrans(_LOWER, _UPPER)
+# Any byte b to the letter (b - ord("A")) mod 26, the arithmetic of the original shift loop
+_FOLD_TO_LETTERS = bytes((b - ord("A")) % 26 + ord("A") for b in range(256))
+_TO_INDEX = bytes.maketrans(_UPPER, bytes(range(26)))
+_NON_LETTERS = bytes(c for c in range(256) if c not in _UPPER + _LOWER)
+_LETTER_RUNS = re.compile(rb"[A-Za-z]+")
+_FROM_INDEX = bytes.maketrans(bytes(range(26)), _UPPER)
+# _MUL_TABLES[k] maps letter index x to k * x mod 26; _MOD26 reduces any byte mod 26
+_MUL_TABLES = [
+    bytes(k * x % 26 if x < 26 else 0 for x in range(256)) for k in range(26)
+]
+_MOD26 = bytes(x % 26 for x in range(256))
+# Byte fields summing k * x mod 26 terms are reduced mod 26 after every 9 terms: a reduced
+# field holds at most 25, and 25 + 9 * 25 = 250 still fits in a byte
+_TERMS_PER_REDUCE = 9
+
+
+def _letter_indices(text: str) -> bytes:
+    """The A-Z letters of text (either case) as bytes 0-25."""
+    data = text.encode("ascii", "ignore").translate(None, _NON_LETTERS)
+    return data.translate(_TO_UPPER).translate(_TO_INDEX)
+
+
 class GCD:
     @staticmethod
     def euclidean(a: int, n: int) -> int:
-        if n == 0:
-            return a
-        return GCD.euclidean(n, a % n)
+        while n != 0:
+            a, n = n, a % n
+        return a
 
     @staticmethod
     def extended(a: int, m: int) -> int:
@@ -17,36 +78,72 @@ class GCD:
         Raises:
             ValueError: If the modular inverse does not exist (i.e. gcd(a, m) ≠ 1).
         """
-        # Lists to store the quotients and remainders.
-        quotients = []
-        remainders = [m, a]
-        # k_values: These will eventually yield the modular inverse.
-        # The starting values are defined as in your example:
-        k_values = [0, 1]
-
-        # Run the Euclidean algorithm.
-        while remainders[-1] != 0:
-            q = remainders[-2] // remainders[-1]
-            r = remainders[-2] % remainders[-1]
-            quotients.append(q)
-            remainders.append(r)
-
-        # The gcd is the second-to-last remainder.
-        gcd = remainders[-2]
+        # Only the last two remainders and k-values are needed at any step.
+        # The starting values are defined as in your example: r = m, a and k = 0, 1
+        prev_r, r = m, a
+        prev_k, k = 0, 1
+
+        # Run the Euclidean algorithm, using the recurrence k_i = k_{i-2} - (q_{i-2} * k_{i-1})
+        while r != 0:
+            q = prev_r // r
+            prev_r, r = r, prev_r - q * r
+            prev_k, k = k, prev_k - q * k
+
+        # The gcd is the last non-zero remainder.
+        gcd = prev_r
         if gcd != 1:
             raise ValueError(
                 f"Multiplicative inverse does not exist because gcd({a}, {m}) = {gcd}"
             )
 
-        # Compute the sequence of k-values.
-        # We already have k_0 and k_1; now compute k_2, k_3, ... up to k_{len(remainders)-2}
-        for i in range(2, len(remainders) - 1):
-            # Using the recurrence: k_i = k_{i-2} - (quotient_{i-2} * k_{i-1})
-            next_k = k_values[i - 2] - quotients[i - 2] * k_values[i - 1]
-            k_values.append(next_k)
+        # The modular inverse is the k-value of that remainder modulo m.
+        return prev_k % m
 
-        # The modular inverse is the last computed k_value modulo m.
-        return k_values[-1] % m
+    @staticmethod
+    def gcd_many(values: list[int], n: int) -> list[int]:
+        """gcd(value, n) for every value."""
+        return [GCD.euclidean(value, n) for value in values]
+
+    @staticmethod
+    def inverse_many(values: list[int], m: int) -> list[int]:
+        """
+        Inverses of all values modulo m with a single extended Euclidean run (Montgomery's
+        trick): invert the product of all values, then peel off one value at a time using
+        the prefix products.
+
+        Raises:
+            ValueError: If any value has no inverse modulo m.
+        """
+        prefix = [1]
+        for value in values:
+            prefix.append(prefix[-1] * value % m)
+        try:
+            inverse = GCD.extended(prefix[-1], m)
+        except ValueError:
+            for value in values:
+                GCD.extended(value, m)  # Raises for the first value without an inverse
+            raise
+
+        inverses = [0] * len(values)
+        for i in range(len(values) - 1, -1, -1):
+            # inverse is 1 / (values[0] * ... * values[i]) here
+            inverses[i] = inverse * prefix[i] % m
+            inverse = inverse * values[i] % m
+        return inverses
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def inverse_table(m: int) -> tuple[int | None, ...]:
+        """
+        Cached table of inverses modulo a small m: table[a] is the inverse of a, or None
+        if gcd(a, m) ≠ 1, so repeated lookups (e.g. mod 26) are O(1).
+        """
+        table = [None] * m
+        for a in range(m):
+            if table[a] is None and GCD.euclidean(a, m) == 1:
+                inverse = GCD.extended(a, m)
+                table[a], table[inverse] = inverse, a
+        return tuple(table)
 
     @staticmethod
     def test_gcd():
@@ -92,10 +189,25 @@ class GCD:
             except ValueError as e:
                 print(f"For a={a}, n={n}: {str(e)}")
 
+    @staticmethod
+    def test_batch():
+        print("\nTesting batch inverses:")
+        values = [3, 5, 7, 9, 11, 15, 17, 19, 21, 23, 25]
+        inverses = GCD.inverse_many(values, 26)
+        print(f"Inverses mod 26 of {values} = {inverses}")
+        table = GCD.inverse_table(26)
+        print(f"Table lookup agrees: {inverses == [table[v] for v in values]}")
+        print(f"gcd with 26 of {list(range(1, 14))} = {GCD.gcd_many(range(1, 14), 26)}")
+        try:
+            GCD.inverse_many([3, 13, 5], 26)
+        except ValueError as e:
+            print(f"For [3, 13, 5] mod 26: {str(e)}")
+
     @staticmethod
     def test_all():
         GCD.test_gcd()
         GCD.test_extended()
+        GCD.test_batch()
 
 
 class IoC:
@@ -113,6 +225,30 @@ class IoC:
         ioc = sum_fi_2 / (N * (N - 1))
         return ioc
 
+    @staticmethod
+    def encode_letters(text: str) -> tuple[bytes, list[int]]:
+        """
+        Clean text the same way as the other IoC methods (letters only, uppercased) and
+        return it as bytes with one byte per letter, plus the byte values that occur.
+        """
+        clean_text = "".join(filter(str.isalpha, text)).upper()
+        if clean_text.isascii():
+            data = clean_text.encode("ascii")
+        else:
+            alphabet = {c: i for i, c in enumerate(sorted(set(clean_text)))}
+            data = clean_text.translate(alphabet).encode("latin-1")
+        return data, sorted(set(data))
+
+    @staticmethod
+    def coset_counts(
+        data: bytes, key_length: int, symbols: list[int]
+    ) -> list[list[int]]:
+        """Count each symbol in every coset data[j::key_length] (one C-level pass per symbol)."""
+        counts = []
+        for j in range(key_length):
+            counts.append(list(map(data[j::key_length].count, symbols)))
+        return counts
+
     @staticmethod
     def friedman_test(
         ciphertext: str, max_key_length: int = 20
@@ -120,21 +256,50 @@ class IoC:
         """
         Perform the Friedman test to determine possible Vigenère key lengths.
         Returns list of (key_length, avg_ioc) tuples sorted by avg_ioc in descending order.
-        """
-        results = []
 
-        # Remove non-alphabetic characters and convert to uppercase
-        clean_text = "".join(c.upper() for c in ciphertext if c.isalpha())
-
-        # Try different key lengths
-        for key_length in range(1, min(max_key_length + 1, len(clean_text))):
-            # Split text into key_length cosets
-            cosets = [""] * key_length
-            for i, char in enumerate(clean_text):
-                cosets[i % key_length] += char
+        The text is encoded to bytes once. Coset counts are only taken directly for key
+        lengths with no multiple in range; coset j of length k is the sum of cosets
+        j, j + k, ... of a multiple of k, so shorter lengths are derived from those.
 
-            # Calculate IoC for each coset
-            coset_iocs = [IoC.calc_ioc(coset) for coset in cosets]
+        Cost: every length above max_key_length // 2 has no multiple in range and takes
+        one bytes.count pass over the text per letter, about 35 ms per MB of text. A
+        sweep to 20 is instant, but a sweep to 300 on 1 MB takes about 5 s, so keep
+        max_key_length near the key lengths that are plausible. Lengths above N // 2
+        leave cosets of a single letter, which have no IoC, so they are not tried.
+        """
+        results = []
+        data, symbols = IoC.encode_letters(ciphertext)
+        N = len(data)
+        key_lengths = range(1, min(max_key_length, N // 2) + 1)
+
+        counts_by_length = {}
+        for key_length in reversed(key_lengths):
+            multiple = next(
+                (
+                    m
+                    for m in range(2 * key_length, key_lengths.stop, key_length)
+                    if m in counts_by_length
+                ),
+                None,
+            )
+            if multiple is None:
+                counts_by_length[key_length] = IoC.coset_counts(
+                    data, key_length, symbols
+                )
+            else:
+                finer = counts_by_length[multiple]
+                counts_by_length[key_length] = [
+                    [sum(col) for col in zip(*finer[j::key_length])]
+                    for j in range(key_length)
+                ]
+
+        for key_length in key_lengths:
+            # Calculate IoC for each coset from its counts, exactly as calc_ioc does
+            coset_iocs = []
+            for j, counts in enumerate(counts_by_length[key_length]):
+                n = (N - j + key_length - 1) // key_length
+                sum_fi_2 = sum(map(mul, counts, counts)) - n
+                coset_iocs.append(sum_fi_2 / (n * (n - 1)))
             avg_ioc = sum(coset_iocs) / len(coset_iocs)
 
             results.append((key_length, avg_ioc))
@@ -181,13 +346,25 @@ class IoC:
 
     @staticmethod
     def print_column_analysis(ciphertext: str, key_length: int):
-        """Print frequency analysis for each column."""
+        """
+        Print frequency analysis for each column, and the shift whose decryption
+        correlates best with English.
+        """
         freqs = IoC.get_column_frequencies(ciphertext, key_length)
+        clean_text = "".join(c.upper() for c in ciphertext if c.isalpha())
 
         for i, column_freq in enumerate(freqs):
             print(f"\nColumn {i + 1} frequencies:")
             for letter, freq in column_freq.items():
                 print(f"{letter}: {freq:.1f}%")
+            counts = IoC.letter_counts(clean_text[i::key_length])
+            if sum(counts):
+                correlations = IoC.correlation_by_shift(counts)
+                shift = max(range(26), key=correlations.__getitem__)
+                print(
+                    f"Best shift: {shift} (key letter {chr(shift + ord('A'))}), "
+                    f"correlation with English {correlations[shift]:.3f}"
+                )
 
     @staticmethod
     def print_columns(text: str, key_length: int):
@@ -251,48 +428,21 @@ class IoC:
         IoC.test_friedman()
         IoC.test_column_analysis()
 
-    # Add the standard English letter frequencies as percentages.
-    ENGLISH_FREQ = {
-        "A": 8.167,
-        "B": 1.492,
-        "C": 2.782,
-        "D": 4.253,
-        "E": 12.702,
-        "F": 2.228,
-        "G": 2.015,
-        "H": 6.094,
-        "I": 6.966,
-        "J": 0.153,
-        "K": 0.772,
-        "L": 4.025,
-        "M": 2.406,
-        "N": 6.749,
-        "O": 7.507,
-        "P": 1.929,
-        "Q": 0.095,
-        "R": 5.987,
-        "S": 6.327,
-        "T": 9.056,
-        "U": 2.758,
-        "V": 0.978,
-        "W": 2.360,
-        "X": 0.150,
-        "Y": 1.974,
-        "Z": 0.074,
-    }
+    # The standard English letter frequencies as percentages.
+    ENGLISH_FREQ = ENGLISH_LETTER_FREQ
 
     @staticmethod
     def decrypt_with_shift(text: str, shift: int) -> str:
         """
         Decrypts the given text by shifting each letter backwards by the given shift.
-        (Assumes that text consists solely of uppercase letters A-Z.)
+        (Assumes that text consists solely of uppercase letters A-Z; other characters are
+        passed through.)
         """
-        decrypted = ""
-        for char in text:
-            # For decryption, subtract the shift (modulo 26)
-            decoded = (ord(char) - ord("A") - shift) % 26
-            decrypted += chr(decoded + ord("A"))
-        return decrypted
+        table = _SHIFT_TABLES[-shift % 26]
+        if text.isascii():
+            return text.encode("ascii").translate(table).decode("ascii")
+        # Non-ASCII text cannot go through the bytes table, so map it per character
+        return text.translate(dict(zip(range(256), table)))
 
     @staticmethod
     def chi_square_for_text(text: str) -> float:
@@ -313,6 +463,77 @@ class IoC:
             chi_sq += ((observed_count - expected_count) ** 2) / expected_count
         return chi_sq
 
+    @staticmethod
+    def shift_letters(text: str) -> bytes:
+        """
+        text as A-Z bytes the way the shift arithmetic sees it: a character other than
+        A-Z (e.g. an accented letter) stands for letter (ord(c) - ord("A")) mod 26, so
+        it keeps its column and rotates with the shift like any other letter.
+        """
+        if not text.isascii():
+            others = {c for c in text if not c.isascii()}
+            text = text.translate(
+                {ord(c): (ord(c) - ord("A")) % 26 + ord("A") for c in others}
+            )
+        return text.encode("ascii").translate(_FOLD_TO_LETTERS)
+
+    @staticmethod
+    def letter_counts(text: str) -> list[int]:
+        """Counts of A-Z in shift_letters(text) (one C-level pass per letter)."""
+        data = IoC.shift_letters(text)
+        return list(map(data.count, range(ord("A"), ord("Z") + 1)))
+
+    @staticmethod
+    def chi_square_by_shift(counts: list[int]) -> list[float]:
+        """
+        Chi-square statistic of the text decrypted with each shift 0-25, given only the
+        A-Z counts of the ciphertext. Decrypting with shift s turns ciphertext letter
+        (L + s) mod 26 into L, so the observed counts for shift s are counts rotated by s.
+        """
+        N = sum(counts)
+        expected = [
+            N * (expected_freq / 100) for expected_freq in IoC.ENGLISH_FREQ.values()
+        ]
+        scores = []
+        for shift in range(26):
+            chi_sq = 0.0
+            for observed_count, expected_count in zip(
+                counts[shift:] + counts[:shift], expected
+            ):
+                chi_sq += ((observed_count - expected_count) ** 2) / expected_count
+            scores.append(chi_sq)
+        return scores
+
+    @staticmethod
+    def correlation_by_shift(counts: list[int]) -> list[float]:
+        """
+        Mutual index of coincidence with English for each shift 0-25 (about 0.065 for the
+        right shift, 0.038 for a wrong one), from the rotated counts as in chi_square_by_shift.
+        The plain IoC of a column does not depend on the shift, so calc_ioc covers that.
+        """
+        N = sum(counts)
+        english = [expected_freq / 100 for expected_freq in IoC.ENGLISH_FREQ.values()]
+        return [
+            sum(map(mul, counts[shift:] + counts[:shift], english)) / N
+            for shift in range(26)
+        ]
+
+    @staticmethod
+    def chi_square_by_shift_for_columns(
+        ciphertext: str, key_length: int
+    ) -> list[list[float]]:
+        """
+        Chi-square for every shift of every column at once: the text is encoded once,
+        each column's A-Z counts are taken from it, and row j holds the 26 scores of column j.
+        """
+        clean_text = "".join(c.upper() for c in ciphertext if c.isalpha())
+        data = IoC.shift_letters(clean_text)
+        letters = range(ord("A"), ord("Z") + 1)
+        return [
+            IoC.chi_square_by_shift(counts)
+            for counts in IoC.coset_counts(data, key_length, letters)
+        ]
+
     @staticmethod
     def candidate_shifts_for_column(column: str) -> list[tuple[int, float]]:
         """
@@ -320,13 +541,44 @@ class IoC:
         chi-square statistic. Returns a list of tuples (shift, chi-square score), sorted by score
         (lowest/best first).
         """
-        candidates = []
-        for shift in range(26):
-            decrypted = IoC.decrypt_with_shift(column, shift)
-            score = IoC.chi_square_for_text(decrypted)
-            candidates.append((shift, score))
-        candidates.sort(key=lambda x: x[1])
-        return candidates
+        scores = IoC.chi_square_by_shift(IoC.letter_counts(column))
+        return sorted(enumerate(scores), key=lambda x: x[1])
+
+    @staticmethod
+    def iter_key_candidates(
+        candidates_per_column: list[list[tuple[int, float]]],
+    ) -> Iterator[tuple[str, float]]:
+        """
+        Lazily yield (key, combined score) for every combination of the per-column
+        candidates (each list sorted by score, best first), in increasing combined score.
+
+        Combinations are rank vectors (one candidate index per column) explored best-first
+        from a heap. A vector's successors increment one column at or after its last
+        non-zero column, so each vector is reached exactly once and never before the
+        vector it came from. Ties come out in rank-vector order, the same order as a
+        stable sort of the Cartesian product.
+        """
+        num_columns = len(candidates_per_column)
+        if num_columns == 0 or not all(candidates_per_column):
+            return
+
+        def total(ranks: tuple[int, ...]) -> float:
+            return sum(candidates_per_column[i][r][1] for i, r in enumerate(ranks))
+
+        start = (0,) * num_columns
+        frontier = [(total(start), start, 0)]
+        while frontier:
+            score, ranks, pivot = heapq.heappop(frontier)
+            key = "".join(
+                chr(candidates_per_column[i][r][0] + ord("A"))
+                for i, r in enumerate(ranks)
+            )
+            yield key, score
+
+            for i in range(pivot, num_columns):
+                if ranks[i] + 1 < len(candidates_per_column[i]):
+                    successor = ranks[:i] + (ranks[i] + 1,) + ranks[i + 1 :]
+                    heapq.heappush(frontier, (total(successor), successor, i))
 
     @staticmethod
     def chi_square_vigenere_candidates(
@@ -338,61 +590,31 @@ class IoC:
         """
         Given a ciphertext and an assumed key length, this method:
 
-        1. Cleans the text and splits it into columns.
-        2. Computes chi-square scores for all 26 shifts for each column.
+        1. Cleans the text and counts the letters of each column.
+        2. Computes chi-square scores for all 26 shifts for each column from those counts.
         3. Keeps only the top_shifts_per_col candidates for each column.
-        4. Forms overall key candidates by taking the Cartesian product over the columns.
+        4. Forms overall key candidates best-first from the per-column candidates.
         5. Returns the top_candidates overall keys with their combined chi-square scores.
 
         Each key candidate is given as a tuple (key, combined_chi_square_score), where the key is a string
         with one letter per column (A–Z, corresponding to shift 0–25).
         """
-        # Clean the ciphertext: keep only letters and convert to uppercase
-        clean_text = "".join(c.upper() for c in ciphertext if c.isalpha())
-        # Split the text into 'key_length' columns (cosets)
-        columns = ["" for _ in range(key_length)]
-        for i, char in enumerate(clean_text):
-            columns[i % key_length] += char
-
-        # For each column, get the candidate shifts (limited to top_shifts_per_col per column)
+        # Score all 26 shifts of every column from the column letter counts, and keep
+        # only the top_shifts_per_col candidates per column
         candidates_per_column = []
-        for col in columns:
-            candidates = IoC.candidate_shifts_for_column(col)[:top_shifts_per_col]
-            candidates_per_column.append(candidates)
+        for scores in IoC.chi_square_by_shift_for_columns(ciphertext, key_length):
+            candidates = sorted(enumerate(scores), key=lambda x: x[1])
+            candidates_per_column.append(candidates[:top_shifts_per_col])
 
-        # Combine the candidates for each column into overall key candidates.
-        overall_candidates = []
-        from itertools import product
-
-        for candidate_tuple in product(*candidates_per_column):
-            # candidate_tuple is a tuple of (shift, score) for each column
-            total_score = sum(item[1] for item in candidate_tuple)
-            # The candidate key is built by converting the shift (0->'A', 1->'B', etc.)
-            key = "".join(chr(item[0] + ord("A")) for item in candidate_tuple)
-            overall_candidates.append((key, total_score))
-
-        overall_candidates.sort(key=lambda x: x[1])
-        return overall_candidates[:top_candidates]
+        # Take only as many combinations as needed instead of sorting the whole product
+        return list(
+            islice(IoC.iter_key_candidates(candidates_per_column), top_candidates)
+        )
 
     @staticmethod
     def vigenere_decrypt(ciphertext: str, key: str) -> str:
         """Decrypt Vigenère cipher with given key."""
-        # Clean the ciphertext
-        clean_text = "".join(c.upper() for c in ciphertext if c.isalpha())
-
-        # Convert key to shifts
-        key_shifts = [ord(k) - ord("A") for k in key.upper()]
-        key_len = len(key_shifts)
-
-        # Decrypt
-        decrypted = ""
-        for i, char in enumerate(clean_text):
-            shift = key_shifts[i % key_len]
-            # Subtract shift (for decryption) and wrap around
-            dec_char = chr((ord(char) - ord("A") - shift) % 26 + ord("A"))
-            decrypted += dec_char
-
-        return decrypted
+        return Vigenere.decrypt(ciphertext, key)
 
     @staticmethod
     def test_chi_square_candidates():
@@ -422,18 +644,562 @@ class IoC:
             print("-" * 50)
 
 
+class Vigenere:
+    """
+    Bytes-based Vigenère engine. Letters in the same key position are transformed
+    together: the strided slice text[j::key_length] goes through one precomputed
+    translate table, so a whole text costs key_length C-level passes.
+    """
+
+    @staticmethod
+    def key_shifts(key: str) -> list[int]:
+        """Shifts 0-25 for the letters of key (A = 0)."""
+        letters = key.upper().encode("ascii", "ignore")
+        shifts = [c - ord("A") for c in letters if c in _UPPER]
+        if not shifts:
+            raise ValueError(f"Key {key!r} has no letters")
+        return shifts
+
+    @staticmethod
+    def transform(
+        data: bytes,
+        shifts: list[int],
+        keep_non_letters: bool = False,
+        phase: int = 0,
+    ) -> tuple[bytes, int]:
+        """
+        Shift the letters of data forward by shifts, starting at key position phase.
+        Without keep_non_letters the output is the uppercased letters only; with it,
+        every other byte stays in place and letters keep their case (the key only
+        advances on letters). Returns (output, number of letters).
+        """
+        letters = data.translate(None, _NON_LETTERS)
+        if not keep_non_letters:
+            letters = letters.translate(_TO_UPPER)
+
+        out = bytearray(letters)
+        key_length = len(shifts)
+        for j in range(min(key_length, len(letters))):
+            table = _SHIFT_TABLES[shifts[(j + phase) % key_length]]
+            out[j::key_length] = letters[j::key_length].translate(table)
+
+        if keep_non_letters:
+            # Put each run of letters back where it came from
+            result = bytearray(data)
+            pos = 0
+            for run in _LETTER_RUNS.finditer(data):
+                end = pos + run.end() - run.start()
+                result[run.start() : run.end()] = out[pos:end]
+                pos = end
+            out = result
+        return bytes(out), len(letters)
+
+    @staticmethod
+    def encrypt(plaintext: str, key: str, keep_non_letters: bool = False) -> str:
+        """Encrypt plaintext with a Vigenère key (non-ASCII characters are dropped)."""
+        data = plaintext.encode("ascii", "ignore")
+        shifts = Vigenere.key_shifts(key)
+        return Vigenere.transform(data, shifts, keep_non_letters)[0].decode("ascii")
+
+    @staticmethod
+    def decrypt(ciphertext: str, key: str, keep_non_letters: bool = False) -> str:
+        """Decrypt ciphertext with a Vigenère key (non-ASCII characters are dropped)."""
+        data = ciphertext.encode("ascii", "ignore")
+        shifts = [-s % 26 for s in Vigenere.key_shifts(key)]
+        return Vigenere.transform(data, shifts, keep_non_letters)[0].decode("ascii")
+
+    @staticmethod
+    def transform_stream(
+        infile: BinaryIO,
+        outfile: BinaryIO,
+        key: str,
+        decrypt: bool = False,
+        keep_non_letters: bool = False,
+        chunk_size: int = 1 << 20,
+    ) -> int:
+        """
+        Encrypt or decrypt a binary file object into another chunk by chunk. The key
+        position carries over from one chunk to the next, so the output is the same as
+        transforming the whole file at once. Returns the number of letters processed.
+        """
+        shifts = Vigenere.key_shifts(key)
+        if decrypt:
+            shifts = [-s % 26 for s in shifts]
+        phase = 0
+        total = 0
+        while chunk := infile.read(chunk_size):
+            out, num_letters = Vigenere.transform(
+                chunk, shifts, keep_non_letters, phase
+            )
+            outfile.write(out)
+            phase = (phase + num_letters) % len(shifts)
+            total += num_letters
+        return total
+
+    @staticmethod
+    def encrypt_stream(infile: BinaryIO, outfile: BinaryIO, key: str, **options) -> int:
+        return Vigenere.transform_stream(infile, outfile, key, decrypt=False, **options)
+
+    @staticmethod
+    def decrypt_stream(infile: BinaryIO, outfile: BinaryIO, key: str, **options) -> int:
+        return Vigenere.transform_stream(infile, outfile, key, decrypt=True, **options)
+
+    @staticmethod
+    def shortest_period(key: str) -> str:
+        """Reduce a key that repeats a shorter key (e.g. BDFBDF -> BDF) to that key."""
+        for period in range(1, len(key)):
+            if len(key) % period == 0 and key[:period] * (len(key) // period) == key:
+                return key[:period]
+        return key
+
+    @staticmethod
+    def crack_vigenere(
+        ciphertext: str,
+        max_key_length: int = 20,
+        num_key_lengths: int = 3,
+        keys_per_length: int = 3,
+        top_shifts_per_col: int = 3,
+    ) -> list[tuple[float, str, str]]:
+        """
+        Crack a Vigenère ciphertext without knowing the key:
+
+        1. Take the num_key_lengths best key lengths from friedman_test.
+        2. Recover keys_per_length keys for each with chi_square_vigenere_candidates.
+        3. Decrypt with every key and score the plaintexts with the quadgram model.
+
+        Returns (quadgram score, key, plaintext) tuples, best first. Keys that repeat a
+        shorter key are reduced to it, so each plaintext appears once.
+        """
+        model = english_model()
+        num_letters = len(IoC.encode_letters(ciphertext)[0])
+        # Every coset needs at least two letters for its IoC
+        max_key_length = min(max_key_length, num_letters // 2)
+        if max_key_length < 1:
+            raise ValueError("Ciphertext is too short to crack")
+
+        plaintexts = {}
+        key_lengths = IoC.friedman_test(ciphertext, max_key_length)[:num_key_lengths]
+        for key_length, _ in key_lengths:
+            candidates = IoC.chi_square_vigenere_candidates(
+                ciphertext, key_length, keys_per_length, top_shifts_per_col
+            )
+            for key, _ in candidates:
+                key = Vigenere.shortest_period(key)
+                if key not in plaintexts:
+                    plaintexts[key] = Vigenere.decrypt(ciphertext, key)
+
+        # Every plaintext has the same number of letters, so they are scored as one batch
+        batch, row_length = encode_batch(plaintexts.values())
+        scores = quadgram_scores(batch, row_length, model)
+        results = [
+            (score, key, plaintext)
+            for score, (key, plaintext) in zip(scores, plaintexts.items())
+        ]
+        return sorted(results, key=lambda x: (-x[0], len(x[1])))
+
+    @staticmethod
+    def _crack_item(args: tuple) -> tuple[int, list[tuple[float, str, str]], float]:
+        """Pool worker: crack one ciphertext and time it."""
+        index, ciphertext, options = args
+        start = time.perf_counter()
+        results = Vigenere.crack_vigenere(ciphertext, **options)
+        return index, results, time.perf_counter() - start
+
+    @staticmethod
+    def crack_vigenere_batch(
+        ciphertexts: list[str], processes: int | None = None, **options
+    ) -> Iterator[tuple[int, list[tuple[float, str, str]], float]]:
+        """
+        Crack many ciphertexts across a process pool, yielding (index, results, seconds)
+        for each one as soon as it finishes (so not in input order). options are passed
+        to crack_vigenere.
+        """
+        tasks = [(i, text, options) for i, text in enumerate(ciphertexts)]
+        if processes == 1 or len(tasks) < 2:
+            yield from map(Vigenere._crack_item, tasks)
+            return
+        with Pool(processes) as pool:
+            yield from pool.imap_unordered(Vigenere._crack_item, tasks)
+
+    @staticmethod
+    def test_crack_vigenere():
+        print("\nTesting automatic Vigenère cracking:")
+        ciphertext = """
+        XKJUROWMLLPXWZNPIMBVBQJCNOWXPCCHHVVFVSLLFVXHAZITYXOHULX
+        QOJAXELXZXMYJAQFSTSRULHHUCDSKBXKNJQIDALLPQSLLUHIAQFPBPC
+        IDSVCIHWHWEWTHBTXRLJNRSNCIHUVFFUXVOUKJLJSWMAQFVJWJSDYLJ
+        OGJXDBOXAJULTUCPZMPLIWMLUBZXVOODYBAFDSKXGQFADSHXNXEHSAR
+        UOJAQFPFKNDHSAAFVULLUWTAQFRUPWJRSZXGPFUTJQIYNRXNYNTWMHC
+        """
+        score, key, plaintext = Vigenere.crack_vigenere(ciphertext)[0]
+        print(f"Key: {key}, quadgram score {score:.2f}")
+        print(f"Decrypted text: {plaintext[:60]}...")
+
+        # A batch of held-out passages (not in the fitness corpus) under different keys
+        with open(HELD_OUT_PATH, encoding="utf-8") as f:
+            held_out = "".join(filter(str.isalpha, f.read())).upper()
+        keys = ["LEMON", "CRYPTOGRAPHY", "KEY", "VIGENERE", "MATHEMATICS", "BULLOCK"]
+        ciphertexts = [
+            Vigenere.encrypt(held_out[i * 500 : i * 500 + 400], key)
+            for i, key in enumerate(keys)
+        ]
+        start = time.perf_counter()
+        for index, results, seconds in Vigenere.crack_vigenere_batch(ciphertexts):
+            status = "ok" if results[0][1] == keys[index] else "MISSED"
+            print(f"Item {index}: key {results[0][1]} ({status}, {seconds:.3f}s)")
+        print(f"Batch of {len(keys)} took {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    def test_vigenere():
+        print("\nTesting Vigenère engine:")
+        plaintext = "When in the Course of human events, it becomes necessary..."
+        key = "BDFHJ"
+        for keep in (False, True):
+            ciphertext = Vigenere.encrypt(plaintext, key, keep_non_letters=keep)
+            decrypted = Vigenere.decrypt(ciphertext, key, keep_non_letters=keep)
+            print(f"keep_non_letters={keep}: {ciphertext} -> {decrypted}")
+
+
+class Kasiski:
+    """
+    Kasiski examination: repeated substrings of the ciphertext are usually the same
+    plaintext under the same part of the key, so their spacings tend to be multiples of
+    the key length.
+    """
+
+    @staticmethod
+    def encode(ciphertext: str) -> bytes:
+        """The A-Z letters of ciphertext (either case) as bytes 0-25."""
+        return _letter_indices(ciphertext)
+
+    @staticmethod
+    def window_codes(letters: bytes) -> memoryview:
+        """
+        Every 3-letter window of letters (bytes 0-25) as one 32-bit value, built with three
+        strided copies instead of a loop: window p fills bytes 4p..4p+2 of a buffer.
+        """
+        num_windows = max(0, len(letters) - 2)
+        cells = bytearray(4 * num_windows)
+        for b in range(3):
+            cells[b::4] = letters[b : b + num_windows]
+        return memoryview(cells).cast("I")
+
+    @staticmethod
+    def trigram_spacings(letters: bytes) -> list[int]:
+        """
+        spacings[p] = distance from 3-letter window p back to the previous occurrence of
+        the same window, or more than len(letters) if it has not occurred before. One
+        pass with a table of last positions indexed by window code.
+        """
+        never = -(len(letters) + 1)
+        max_code = int.from_bytes(bytes([25, 25, 25, 0]), sys.byteorder)
+        last = [never] * (max_code + 1)
+        spacings = []
+        append = spacings.append
+        for p, code in enumerate(Kasiski.window_codes(letters)):
+            append(p - last[code])
+            last[code] = p
+        return spacings
+
+    @staticmethod
+    def repeat_spacings(ciphertext: str, min_length: int = 3) -> Counter:
+        """
+        Counter of spacing -> number of repeated substrings of at least min_length letters
+        with that spacing. A repeat of length L shows up as L - 2 consecutive windows with
+        the same spacing, so each run is counted once, as one maximal repeat.
+        """
+        letters = Kasiski.encode(ciphertext)
+        spacings = Kasiski.trigram_spacings(letters)
+
+        if min_length <= 3:
+            # A run starts wherever the spacing differs from the previous window's
+            starts = compress(spacings, map(ne, spacings, chain((0,), spacings)))
+            counts = Counter(starts)
+        else:
+            counts = Counter(
+                spacing
+                for spacing, run in groupby(spacings)
+                if sum(1 for _ in run) >= min_length - 2
+            )
+        for spacing in [d for d in counts if d > len(letters)]:
+            del counts[spacing]
+        return counts
+
+    @staticmethod
+    def key_length_histogram(
+        ciphertext: str, max_key_length: int = 20, min_length: int = 3
+    ) -> list[tuple[int, int, float]]:
+        """
+        Ranked Kasiski histogram: (key_length, repeats whose spacing it divides, score),
+        best first. score = count * key_length / total repeats, so chance repeats give
+        about 1.0 and the key length (and its multiples) stand out above that.
+        """
+        counts = Kasiski.repeat_spacings(ciphertext, min_length)
+        total = sum(counts.values())
+        if total == 0:
+            return []
+        results = []
+        for key_length in range(2, max_key_length + 1):
+            count = sum(c for d, c in counts.items() if d % key_length == 0)
+            results.append((key_length, count, count * key_length / total))
+        return sorted(results, key=lambda x: (-x[2], x[0]))
+
+    @staticmethod
+    def repeated_trigrams(
+        ciphertext: str, top: int = 10
+    ) -> list[tuple[str, list[int], int]]:
+        """
+        The top most frequent repeated trigrams as (trigram, positions, GCD of spacings),
+        the table a Kasiski examination is usually done from by hand.
+        """
+        letters = Kasiski.encode(ciphertext)
+        positions = {}
+        for p, spacing in enumerate(Kasiski.trigram_spacings(letters)):
+            if spacing <= len(letters):
+                positions.setdefault(letters[p : p + 3], [p - spacing]).append(p)
+
+        ranked = sorted(positions.items(), key=lambda x: (-len(x[1]), x[1][0]))[:top]
+        results = []
+        for trigram, where in ranked:
+            spacings = [b - a for a, b in zip(where, where[1:])]
+            text = bytes(c + ord("A") for c in trigram).decode("ascii")
+            results.append((text, where, reduce(GCD.euclidean, spacings)))
+        return results
+
+    @staticmethod
+    def cross_check(
+        ciphertext: str, max_key_length: int = 20
+    ) -> list[tuple[int, float, float]]:
+        """
+        Compare Kasiski with friedman_test: (key_length, Kasiski score, average IoC) for
+        every key length, sorted by the sum of its ranks in the two tests (shorter key
+        lengths first on ties).
+        """
+        histogram = Kasiski.key_length_histogram(ciphertext, max_key_length)
+        kasiski = {k: score for k, _, score in histogram}
+        friedman = dict(IoC.friedman_test(ciphertext, max_key_length))
+        lengths = [k for k in range(2, max_key_length + 1) if k in friedman]
+
+        by_kasiski = sorted(lengths, key=lambda k: -kasiski.get(k, 0.0))
+        by_friedman = sorted(lengths, key=lambda k: -friedman[k])
+        rank = {k: by_kasiski.index(k) + by_friedman.index(k) for k in lengths}
+        lengths.sort(key=lambda k: (rank[k], k))
+        return [(k, kasiski.get(k, 0.0), friedman[k]) for k in lengths]
+
+    @staticmethod
+    def estimate_key_length(
+        ciphertext: str,
+        max_key_length: int = 20,
+        tolerance: float = 0.7,
+        ioc_tolerance: float = 0.9,
+    ) -> int:
+        """
+        Best key length from cross_check. Multiples of the key length score about as well
+        as the key length itself in both tests, so the smallest divisor of the best length
+        that keeps tolerance times its Kasiski score and ioc_tolerance times its IoC is
+        returned instead.
+        """
+        checked = Kasiski.cross_check(ciphertext, max_key_length)
+        if not checked:
+            raise ValueError("Ciphertext is too short to estimate a key length")
+        best, best_score, best_ioc = checked[0]
+        scores = {k: (score, ioc) for k, score, ioc in checked}
+        for d in range(2, best):
+            if best % d == 0 and d in scores:
+                score, ioc = scores[d]
+                if score >= tolerance * best_score and ioc >= ioc_tolerance * best_ioc:
+                    return d
+        return best
+
+    @staticmethod
+    def test_kasiski():
+        print("\nTesting Kasiski examination:")
+        ciphertext = """
+        XKJUROWMLLPXWZNPIMBVBQJCNOWXPCCHHVVFVSLLFVXHAZITYXOHULX
+        QOJAXELXZXMYJAQFSTSRULHHUCDSKBXKNJQIDALLPQSLLUHIAQFPBPC
+        IDSVCIHWHWEWTHBTXRLJNRSNCIHUVFFUXVOUKJLJSWMAQFVJWJSDYLJ
+        OGJXDBOXAJULTUCPZMPLIWMLUBZXVOODYBAFDSKXGQFADSHXNXEHSAR
+        UOJAQFPFKNDHSAAFVULLUWTAQFRUPWJRSZXGPFUTJQIYNRXNYNTWMHC
+        """
+        for trigram, positions, gcd in Kasiski.repeated_trigrams(ciphertext, top=5):
+            print(f"{trigram} at {positions}: GCD of spacings = {gcd}")
+
+        print("\nKey lengths (Kasiski score, Friedman average IoC):")
+        for key_length, score, avg_ioc in Kasiski.cross_check(ciphertext, 15)[:5]:
+            print(f"Length {key_length}: Kasiski {score:.2f}, IoC {avg_ioc:.3f}")
+        print(f"Estimated key length: {Kasiski.estimate_key_length(ciphertext, 15)}")
+
+        # A long ciphertext: 10 MB of corpus text under a 7-letter key
+        with open(CORPUS_PATH, encoding="utf-8") as f:
+            corpus = "".join(filter(str.isalpha, f.read())).upper()
+        repeats = 10_000_000 // len(corpus) + 1
+        long_text = Vigenere.encrypt(corpus * repeats, "KASISKI")
+        start = time.perf_counter()
+        histogram = Kasiski.key_length_histogram(long_text[:10_000_000])
+        elapsed = time.perf_counter() - start
+        print(f"\n10 MB ciphertext in {elapsed:.2f}s, best lengths:")
+        for key_length, count, score in histogram[:3]:
+            print(f"Length {key_length}: {count} repeats, score {score:.2f}")
+
+
+class SlidingIoC:
+    """
+    Index of Coincidence over the last window letters of a stream, for spotting where
+    the language or cipher changes. Each letter entering or leaving the window updates
+    the counts and sum f(f - 1) in O(1), plus one coset per tracked key length, so the
+    IoC and friedman_test-style key length estimates never rescan the window.
+    """
+
+    def __init__(
+        self,
+        window: int = 500,
+        max_key_length: int = 20,
+        sample_every: int = 1,
+        history_limit: int = 10_000,
+    ):
+        self.window = window
+        self.max_key_length = max_key_length
+        self.sample_every = sample_every
+        self.history_limit = history_limit
+        self.position = 0  # letters seen so far
+        self.history: list[tuple[int, float]] = []
+
+        self._letters = deque()
+        self._counts = [0] * 26
+        self._sum_fi_2 = 0
+        # Coset j of key length k holds the letters at stream positions p with p % k == j
+        self._coset_counts = [
+            [[0] * 26 for _ in range(k)] for k in range(max_key_length + 1)
+        ]
+        self._coset_sums = [[0] * k for k in range(max_key_length + 1)]
+        self._coset_sizes = [[0] * k for k in range(max_key_length + 1)]
+        self._thresholds: list[list] = []
+
+    def _update(self, position: int, letter: int, step: int):
+        """Add (step = 1) or remove (step = -1) the letter at a stream position."""
+        # f(f - 1) changes by 2f when f goes up by one and by -2(f - 1) when it goes down
+        f = self._counts[letter]
+        self._sum_fi_2 += 2 * f if step > 0 else -2 * (f - 1)
+        self._counts[letter] = f + step
+        for k in range(1, self.max_key_length + 1):
+            j = position % k
+            counts = self._coset_counts[k][j]
+            f = counts[letter]
+            self._coset_sums[k][j] += 2 * f if step > 0 else -2 * (f - 1)
+            counts[letter] = f + step
+            self._coset_sizes[k][j] += step
+
+    def push(self, letter: str):
+        """Add one letter (A-Z, either case) to the stream; anything else is ignored."""
+        c = ord(letter.upper()) - ord("A")
+        if not 0 <= c < 26:
+            return
+        self._letters.append(c)
+        self._update(self.position, c, 1)
+        if len(self._letters) > self.window:
+            oldest = self._letters.popleft()
+            self._update(self.position - self.window, oldest, -1)
+        self.position += 1
+
+        if self.position % self.sample_every == 0:
+            self.history.append((self.position, self.ioc))
+            if len(self.history) >= self.history_limit:
+                self.decimate(2)
+        if self._thresholds and len(self._letters) == self.window:
+            self._check_thresholds()
+
+    def feed(self, text: str):
+        """Push every character of text."""
+        for letter in text:
+            self.push(letter)
+
+    @property
+    def ioc(self) -> float:
+        """IoC of the letters currently in the window (0.0 with fewer than two)."""
+        N = len(self._letters)
+        return self._sum_fi_2 / (N * (N - 1)) if N > 1 else 0.0
+
+    def coset_ioc(self, key_length: int) -> float:
+        """Average IoC of the key_length cosets of the window, as in friedman_test."""
+        iocs = [
+            total / (n * (n - 1))
+            for total, n in zip(
+                self._coset_sums[key_length], self._coset_sizes[key_length]
+            )
+            if n > 1
+        ]
+        return sum(iocs) / len(iocs) if iocs else 0.0
+
+    def key_length_estimates(self) -> list[tuple[int, float]]:
+        """(key_length, avg_ioc) for the current window, sorted like friedman_test."""
+        lengths = range(1, min(self.max_key_length + 1, len(self._letters)))
+        results = [(k, self.coset_ioc(k)) for k in lengths]
+        return sorted(results, key=lambda x: x[1], reverse=True)
+
+    def decimate(self, factor: int):
+        """Keep every factor-th history sample and sample that much less often from now on."""
+        self.history = self.history[factor - 1 :: factor]
+        self.sample_every *= factor
+
+    def add_threshold(
+        self,
+        threshold: float,
+        callback: Callable[[int, float, bool], None],
+        hysteresis: float = 0.0,
+    ):
+        """
+        Call callback(position, ioc, rising) whenever the IoC of a full window crosses
+        threshold, with rising True when it goes from below to above. With hysteresis,
+        the IoC has to get that far past the threshold to count as a crossing, so noise
+        around the threshold does not fire the callback repeatedly.
+        """
+        self._thresholds.append([threshold, hysteresis, callback, None])
+
+    def _check_thresholds(self):
+        ioc = self.ioc
+        for entry in self._thresholds:
+            threshold, hysteresis, callback, was_above = entry
+            if was_above is None:
+                entry[3] = ioc >= threshold
+            elif was_above and ioc < threshold - hysteresis:
+                entry[3] = False
+                callback(self.position, ioc, False)
+            elif not was_above and ioc >= threshold + hysteresis:
+                entry[3] = True
+                callback(self.position, ioc, True)
+
+    @staticmethod
+    def test_sliding_ioc():
+        print("\nTesting sliding-window IoC:")
+        with open(CORPUS_PATH, encoding="utf-8") as f:
+            corpus = "".join(filter(str.isalpha, f.read())).upper()
+        english = corpus[:3000]
+        vigenere = Vigenere.encrypt(corpus[3000:6000], "LEMON")
+        stream = english + vigenere + english
+
+        tracker = SlidingIoC(window=400, max_key_length=10, sample_every=100)
+        tracker.add_threshold(
+            0.055,
+            lambda position, ioc, rising: print(
+                f"Letter {position}: IoC {'rose' if rising else 'fell'} to {ioc:.4f}"
+            ),
+            hysteresis=0.002,
+        )
+        start = time.perf_counter()
+        tracker.feed(stream[:4500])
+        estimates = tracker.key_length_estimates()[:3]
+        print(f"Key lengths in the Vigenère section: {estimates}")
+        tracker.feed(stream[4500:])
+        elapsed = time.perf_counter() - start
+        samples = len(tracker.history)
+        print(f"{len(stream)} letters in {elapsed:.2f}s, {samples} history samples")
+
+
 class Matrix2x2:
     @staticmethod
     def multiply_mod26(A: list[list[int]], B: list[list[int]]) -> list[list[int]]:
         """Multiply two 2x2 matrices and reduce entries modulo 26."""
-        result = [[0, 0], [0, 0]]
-        for i in range(2):
-            for j in range(2):
-                sum = 0
-                for k in range(2):
-                    sum += A[i][k] * B[k][j]
-                result[i][j] = sum % 26
-        return result
+        return MatrixMod.multiply(A, B, 26)
 
     @staticmethod
     def determinant_mod26(A: list[list[int]]) -> int:
@@ -446,11 +1212,13 @@ class Matrix2x2:
         """Calculate inverse of 2x2 matrix modulo 26."""
         det = Matrix2x2.determinant_mod26(A)
 
-        # Find multiplicative inverse of determinant mod 26
-        try:
-            det_inv = GCD.extended(det, 26)
-        except ValueError as e:
-            raise ValueError(f"Matrix is not invertible: {str(e)}")
+        # Look up the multiplicative inverse of determinant mod 26
+        det_inv = GCD.inverse_table(26)[det]
+        if det_inv is None:
+            raise ValueError(
+                "Matrix is not invertible: Multiplicative inverse does not exist "
+                + f"because gcd({det}, 26) = {GCD.euclidean(det, 26)}"
+            )
 
         # Calculate adjugate matrix
         adj = [[A[1][1], (-A[0][1]) % 26], [(-A[1][0]) % 26, A[0][0]]]
@@ -487,6 +1255,395 @@ class Matrix2x2:
                 print(f"Error: {str(e)}")
 
 
+class MatrixMod:
+    """Square matrices (lists of rows) over the integers modulo m."""
+
+    @staticmethod
+    def identity(n: int) -> list[list[int]]:
+        return [[int(i == j) for j in range(n)] for i in range(n)]
+
+    @staticmethod
+    def multiply(A: list[list[int]], B: list[list[int]], m: int) -> list[list[int]]:
+        """Multiply two matrices and reduce entries modulo m."""
+        columns = list(zip(*B))
+        return [[sum(map(mul, row, col)) % m for col in columns] for row in A]
+
+    @staticmethod
+    def determinant(A: list[list[int]], m: int) -> int:
+        """
+        Determinant modulo m. Bareiss elimination keeps every step an exact integer
+        division, so it works for any m, including composite moduli like 26.
+        """
+        M = [list(row) for row in A]
+        n = len(M)
+        sign = 1
+        prev = 1
+        for k in range(n - 1):
+            if M[k][k] == 0:
+                swap = next((i for i in range(k + 1, n) if M[i][k] != 0), None)
+                if swap is None:
+                    return 0
+                M[k], M[swap] = M[swap], M[k]
+                sign = -sign
+            for i in range(k + 1, n):
+                for j in range(k + 1, n):
+                    M[i][j] = (M[i][j] * M[k][k] - M[i][k] * M[k][j]) // prev
+            prev = M[k][k]
+        return sign * M[n - 1][n - 1] % m if n else 1 % m
+
+    @staticmethod
+    def adjugate(A: list[list[int]], m: int) -> list[list[int]]:
+        """Transpose of the cofactor matrix, modulo m."""
+        n = len(A)
+        if n == 1:
+            return [[1 % m]]
+        adj = [[0] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(n):
+                minor = [row[:j] + row[j + 1 :] for k, row in enumerate(A) if k != i]
+                adj[j][i] = (-1) ** (i + j) * MatrixMod.determinant(minor, m) % m
+        return adj
+
+    @staticmethod
+    def inverse(A: list[list[int]], m: int) -> list[list[int]]:
+        """Inverse modulo m: the adjugate times the inverse of the determinant."""
+        det = MatrixMod.determinant(A, m)
+        try:
+            det_inv = GCD.extended(det, m)
+        except ValueError as e:
+            raise ValueError(f"Matrix is not invertible: {str(e)}")
+        return [[det_inv * x % m for x in row] for row in MatrixMod.adjugate(A, m)]
+
+    @staticmethod
+    def test_matrix_mod():
+        print("\nTesting N x N matrices mod 26:")
+        A = [[6, 24, 1], [13, 16, 10], [20, 17, 15]]
+        inv = MatrixMod.inverse(A, 26)
+        print(f"det = {MatrixMod.determinant(A, 26)}, inverse = {inv}")
+        print(f"A * inverse = {MatrixMod.multiply(A, inv, 26)}")
+        try:
+            MatrixMod.inverse([[2, 4], [6, 8]], 26)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+
+
+class Hill:
+    """
+    Hill cipher over A-Z. A text of letter indices is treated as a (blocks x N) matrix
+    and multiplied by the N x N key in one go, column by column: input column i
+    (letters[i::N]) goes through a translate table for "times key[i][j] mod 26", the
+    results for output column j are added as one big integer per column (reduced mod 26
+    every _TERMS_PER_REDUCE terms so no byte field overflows, for any N), and a final
+    translate reduces each byte mod 26.
+    """
+
+    @staticmethod
+    def transform(letters: bytes, key: list[list[int]]) -> bytes:
+        """Multiply the blocks of letters (bytes 0-25, a whole number of blocks) by key mod 26."""
+        n = len(key)
+        if len(letters) % n:
+            raise ValueError(f"Text length {len(letters)} is not a multiple of {n}")
+        blocks = len(letters) // n
+        columns = [letters[i::n] for i in range(n)]
+        out = bytearray(len(letters))
+        for j in range(n):
+            total = 0
+            for i in range(n):
+                table = _MUL_TABLES[key[i][j] % 26]
+                total += int.from_bytes(columns[i].translate(table), "little")
+                if i % _TERMS_PER_REDUCE == _TERMS_PER_REDUCE - 1:
+                    # Reduce before a byte field can pass 255
+                    reduced = total.to_bytes(blocks, "little").translate(_MOD26)
+                    total = int.from_bytes(reduced, "little")
+            out[j::n] = total.to_bytes(blocks, "little").translate(_MOD26)
+        return bytes(out)
+
+    @staticmethod
+    def encrypt(plaintext: str, key: list[list[int]], pad: str = "X") -> str:
+        """Encrypt the letters of plaintext, padding the last block with pad."""
+        MatrixMod.inverse(key, 26)  # The key must be invertible to be usable
+        letters = _letter_indices(plaintext)
+        letters += _letter_indices(pad) * (-len(letters) % len(key))
+        return Hill.transform(letters, key).translate(_FROM_INDEX).decode("ascii")
+
+    @staticmethod
+    def decrypt(ciphertext: str, key: list[list[int]]) -> str:
+        """Decrypt the letters of ciphertext (padding is left on the end)."""
+        inverse = MatrixMod.inverse(key, 26)
+        letters = _letter_indices(ciphertext)
+        return Hill.transform(letters, inverse).translate(_FROM_INDEX).decode("ascii")
+
+    @staticmethod
+    def transform_stream(
+        infile: BinaryIO,
+        outfile: BinaryIO,
+        key: list[list[int]],
+        decrypt: bool = False,
+        pad: str = "X",
+        chunk_size: int = 1 << 20,
+    ) -> int:
+        """
+        Encrypt or decrypt the letters of a binary file object chunk by chunk, carrying
+        letters that do not fill a block over to the next chunk. Encryption pads the
+        last block; decryption requires a whole number of blocks. Returns the number of
+        letters written.
+        """
+        inverse = MatrixMod.inverse(key, 26)  # Also checks that the key is usable
+        matrix = inverse if decrypt else key
+        n = len(key)
+        pending = b""
+        written = 0
+        while chunk := infile.read(chunk_size):
+            letters = pending + _letter_indices(chunk.decode("ascii", "ignore"))
+            usable = len(letters) - len(letters) % n
+            pending = letters[usable:]
+            out = Hill.transform(letters[:usable], matrix)
+            outfile.write(out.translate(_FROM_INDEX))
+            written += usable
+        if pending:
+            if decrypt:
+                raise ValueError(f"Ciphertext does not end on a block of {n} letters")
+            pending += _letter_indices(pad) * (n - len(pending))
+            outfile.write(Hill.transform(pending, matrix).translate(_FROM_INDEX))
+            written += n
+        return written
+
+    @staticmethod
+    def encrypt_stream(
+        infile: BinaryIO, outfile: BinaryIO, key: list[list[int]], **options
+    ) -> int:
+        return Hill.transform_stream(infile, outfile, key, decrypt=False, **options)
+
+    @staticmethod
+    def decrypt_stream(
+        infile: BinaryIO, outfile: BinaryIO, key: list[list[int]], **options
+    ) -> int:
+        return Hill.transform_stream(infile, outfile, key, decrypt=True, **options)
+
+    @staticmethod
+    def test_hill():
+        print("\nTesting Hill cipher:")
+        key = [[6, 24, 1], [13, 16, 10], [20, 17, 15]]
+        ciphertext = Hill.encrypt("Act at once", key)
+        decrypted = Hill.decrypt(ciphertext, key)
+        print(f"Key {key}: ACTATONCE -> {ciphertext} -> {decrypted}")
+
+        with open(CORPUS_PATH, encoding="utf-8") as f:
+            corpus = "".join(filter(str.isalpha, f.read())).upper()
+        big = corpus * (1_000_000 // len(corpus) + 1)
+        start = time.perf_counter()
+        encrypted = Hill.encrypt(big, key)
+        elapsed = time.perf_counter() - start
+        roundtrip = Hill.decrypt(encrypted, key)[: len(big)] == big
+        print(f"Encrypted {len(big)} letters in {elapsed:.3f}s, round trip: {roundtrip}")
+
+        # Large N, with every term at its maximum of 25 (key entries 1, letters Z), so a
+        # byte field would overflow if partial sums were reduced too rarely
+        for n in (9, 10, 19, 20, 28, 40):
+            key = [[1] * n for _ in range(n)]
+            letters = bytes([25]) * (3 * n)
+            blocks = [list(letters[b : b + n]) for b in range(0, len(letters), n)]
+            expected = bytes(sum(MatrixMod.multiply(blocks, key, 26), []))
+            print(f"N = {n}: transform matches matrix product: {Hill.transform(letters, key) == expected}")
+
+
+class HillCracker:
+    """
+    Key recovery for the Hill cipher. Decryption multiplies each ciphertext block (row
+    vector c) by the inverse key D, so plaintext letter j of every block is c . D[:, j]
+    and depends on column j of D only. All 26^N possible columns are therefore decrypted
+    once, as stacked translate/big-integer operations like Hill.transform, and whole keys
+    are assembled from those precomputed plaintext columns.
+    """
+
+    @staticmethod
+    def column_plaintexts(letters: bytes, n: int) -> list[bytes]:
+        """
+        Plaintext letters produced by every possible decryption column, for blocks of n
+        letters: entry v (a base-26 number whose digits are the column from top to
+        bottom) is the sequence of c . column over all blocks.
+        """
+        blocks = len(letters) // n
+        columns = [letters[i : blocks * n : n] for i in range(n)]
+        # terms[i][k] = (k * column i) as a big integer of byte fields
+        terms = [
+            [int.from_bytes(col.translate(_MUL_TABLES[k]), "little") for k in range(26)]
+            for col in columns
+        ]
+        results = []
+        for vector in product(range(26), repeat=n):
+            total = 0
+            for i, k in enumerate(vector):
+                total += terms[i][k]
+                if i % _TERMS_PER_REDUCE == _TERMS_PER_REDUCE - 1:
+                    reduced = total.to_bytes(blocks, "little").translate(_MOD26)
+                    total = int.from_bytes(reduced, "little")
+            results.append(total.to_bytes(blocks, "little").translate(_MOD26))
+        return results
+
+    @staticmethod
+    def _sweep_chunk(args: tuple) -> list[tuple[float, int, int]]:
+        """
+        Pool worker: best (score, col0, col1) pairs for col0 in [start, stop). For each
+        first column, the plaintexts of all second columns that make an invertible key
+        are stacked into one batch and scored together.
+        """
+        letters, start, stop, top_k = args
+        model = english_model()
+        inverses = GCD.inverse_table(26)
+        plaintexts = HillCracker.column_plaintexts(letters, 2)
+        row_length = 2 * len(plaintexts[0])
+        # Rows with the second plaintext column in place and the first left blank
+        second = []
+        for column in plaintexts:
+            row = bytearray(row_length)
+            row[1::2] = column
+            second.append(bytes(row))
+
+        best = []
+        for col0 in range(start, stop):
+            a, c = divmod(col0, 26)  # D[0][0], D[1][0]
+            # col1 = 26 * D[0][1] + D[1][1]
+            valid = [
+                col1
+                for col1 in range(676)
+                if inverses[(a * (col1 % 26) - col1 // 26 * c) % 26] is not None
+            ]
+            if not valid:
+                continue
+            batch = bytearray(b"".join(map(second.__getitem__, valid)))
+            batch[0::2] = plaintexts[col0] * len(valid)
+            for score, col1 in zip(quadgram_scores(batch, row_length, model), valid):
+                item = (score, col0, col1)
+                if len(best) < top_k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+        return best
+
+    @staticmethod
+    def sweep_2x2(
+        ciphertext: str, top_k: int = 5, processes: int | None = 1, chunks: int = 26
+    ) -> list[tuple[float, list[list[int]], str]]:
+        """
+        Ciphertext-only attack: try every invertible 2x2 decryption matrix, score each
+        plaintext with the quadgram model and return the top_k as (score, encryption
+        key, plaintext), best first. With processes other than 1, the first columns are
+        split into chunks and swept by a process pool (processes=None uses all cores).
+        """
+        letters = _letter_indices(ciphertext)
+        letters = letters[: len(letters) - len(letters) % 2]
+        if len(letters) < 4:
+            raise ValueError("Ciphertext is too short to crack")
+        bounds = [676 * i // chunks for i in range(chunks + 1)]
+        tasks = [(letters, bounds[i], bounds[i + 1], top_k) for i in range(chunks)]
+        if processes == 1:
+            parts = map(HillCracker._sweep_chunk, tasks)
+        else:
+            with Pool(processes) as pool:
+                parts = pool.map(HillCracker._sweep_chunk, tasks)
+
+        best = heapq.nlargest(top_k, chain.from_iterable(parts))
+        results = []
+        for score, col0, col1 in best:
+            (a, c), (b, d) = divmod(col0, 26), divmod(col1, 26)
+            key = MatrixMod.inverse([[a, b], [c, d]], 26)
+            results.append((score, key, Hill.decrypt(ciphertext, key)))
+        return results
+
+    @staticmethod
+    def crack_rows(
+        ciphertext: str, n: int, top_columns: int = 8, top_k: int = 5
+    ) -> list[tuple[float, list[list[int]], str]]:
+        """
+        Row-by-row attack for any block size n: rank all 26^n decryption columns by how
+        English their plaintext letters are on their own (chi-square against English
+        letter frequencies), then try every arrangement of n of the top_columns best
+        into an invertible decryption matrix and rank those by quadgram score. Returns
+        (score, key, plaintext) tuples, best first.
+        """
+        model = english_model()
+        letters = _letter_indices(ciphertext)
+        letters = letters[: len(letters) - len(letters) % n]
+        plaintexts = HillCracker.column_plaintexts(letters, n)
+
+        def column_chi_square(v: int) -> float:
+            counts = list(map(plaintexts[v].count, range(26)))
+            return IoC.chi_square_by_shift(counts)[0]
+
+        ranked = heapq.nsmallest(top_columns, range(26**n), key=column_chi_square)
+        digits = {v: [v // 26 ** (n - 1 - i) % 26 for i in range(n)] for v in ranked}
+
+        results = []
+        buffer = bytearray(len(letters))
+        for chosen in permutations(ranked, n):
+            D = [[digits[v][i] for v in chosen] for i in range(n)]
+            if GCD.inverse_table(26)[MatrixMod.determinant(D, 26)] is None:
+                continue
+            for j, v in enumerate(chosen):
+                buffer[j::n] = plaintexts[v]
+            results.append((model.score(buffer, encoded=True), D))
+        results.sort(key=lambda x: -x[0])
+
+        cracked = []
+        for score, D in results[:top_k]:
+            key = MatrixMod.inverse(D, 26)
+            cracked.append((score, key, Hill.decrypt(ciphertext, key)))
+        return cracked
+
+    @staticmethod
+    def known_plaintext(
+        plaintext: str, ciphertext: str, n: int = 2
+    ) -> list[list[int]]:
+        """
+        Solve the n x n key from matching plaintext and ciphertext: pick n blocks whose
+        plaintext matrix P is invertible mod 26, then K = P^-1 C. The key is checked
+        against every other block before it is returned.
+        """
+        p_letters = _letter_indices(plaintext)
+        c_letters = _letter_indices(ciphertext)
+        length = min(len(p_letters), len(c_letters)) // n * n
+        p_blocks = [list(p_letters[i : i + n]) for i in range(0, length, n)]
+        c_blocks = [list(c_letters[i : i + n]) for i in range(0, length, n)]
+
+        for chosen in combinations(range(len(p_blocks)), n):
+            P = [p_blocks[i] for i in chosen]
+            if GCD.inverse_table(26)[MatrixMod.determinant(P, 26)] is None:
+                continue
+            key = MatrixMod.multiply(
+                MatrixMod.inverse(P, 26), [c_blocks[i] for i in chosen], 26
+            )
+            if MatrixMod.multiply(p_blocks, key, 26) == c_blocks:
+                return key
+        raise ValueError(f"No {n} plaintext blocks determine a consistent key")
+
+    @staticmethod
+    def test_hill_cracker():
+        print("\nTesting Hill key recovery:")
+        with open(HELD_OUT_PATH, encoding="utf-8") as f:
+            held_out = "".join(filter(str.isalpha, f.read())).upper()
+        plaintext = held_out[:120]
+        key = [[3, 3], [2, 5]]
+        ciphertext = Hill.encrypt(plaintext, key)
+
+        solved = HillCracker.known_plaintext(plaintext[:20], ciphertext[:20])
+        print(f"Known plaintext ({plaintext[:20]}): key {solved}")
+
+        start = time.perf_counter()
+        score, found, decrypted = HillCracker.sweep_2x2(ciphertext, processes=None)[0]
+        elapsed = time.perf_counter() - start
+        print(f"Full 2x2 sweep in {elapsed:.2f}s: key {found}, score {score:.2f}")
+        print(f"Decrypted text: {decrypted[:60]}...")
+
+        key3 = [[6, 24, 1], [13, 16, 10], [20, 17, 15]]
+        ciphertext3 = Hill.encrypt(held_out[1000:1300], key3)
+        start = time.perf_counter()
+        score, found, decrypted = HillCracker.crack_rows(ciphertext3, 3)[0]
+        elapsed = time.perf_counter() - start
+        print(f"3x3 row-by-row in {elapsed:.2f}s: key {found}")
+        print(f"Decrypted text: {decrypted[:60]}...")
+
+
 if __name__ == "__main__":
     # Run individual tests
     # GCD.test_gcd()
@@ -499,7 +1656,16 @@ if __name__ == "__main__":
 # IoC.test_all()
 
 # Matrix2x2.test_matrix()
+# MatrixMod.test_matrix_mod()
+# Hill.test_hill()
+# HillCracker.test_hill_cracker()
 
 # Example: Run just the column analysis for problem 3
 # IoC.test_column_analysis()
 # IoC.test_chi_square_candidates()
+
+# Vigenere.test_vigenere()
+# Vigenere.test_crack_vigenere()
+
+# Kasiski.test_kasiski()
+# SlidingIoC.test_sliding_ioc()
@@ -0,0 +1,249 @@
+from array import array
+from math import lcm
+from operator import eq
+import time
+
+
+class Permutation:
+    """
+    A permutation of the points 0, 1, ..., n - 1, stored as the array of images: p[i] is
+    where p sends i. Products follow the HW4 convention of composing right to left, so
+    (p * q)(i) = p(q(i)), which is also the order in which gather indices combine:
+    applying p and then q is one gather with p * q, q.apply(p.apply(text)) ==
+    (p * q).apply(text). Array-wide work (compose, apply, equality) runs as C-level
+    map/gather calls, and everything else is a single O(n) pass, so permutations of
+    millions of points are practical.
+    """
+
+    __slots__ = ("images",)
+
+    def __init__(self, images, check: bool = True):
+        """Wrap a sequence of images. check verifies that it really is a permutation."""
+        self.images = images if isinstance(images, array) else array("q", images)
+        if check:
+            n = len(self.images)
+            in_range = n == 0 or (min(self.images) >= 0 and max(self.images) < n)
+            if len(set(self.images)) != n or not in_range:
+                raise ValueError("Images must contain each of 0 to n - 1 exactly once")
+
+    @staticmethod
+    def identity(n: int) -> "Permutation":
+        return Permutation(array("q", range(n)), check=False)
+
+    @staticmethod
+    def from_cycles(
+        cycles: list[list[int]], n: int | None = None, base: int = 0
+    ) -> "Permutation":
+        """
+        Build a permutation from cycle notation. The cycles need not be disjoint; like a
+        product they are applied right to left, so from_cycles([[1, 4, 8, 5], [1, 3, 6, 7],
+        [2, 9]], 9, base=1) is (1 4 8 5)(1 3 6 7)(2 9). base is the label of point 0
+        (1 for textbook notation). n defaults to the largest point.
+        """
+        if n is None:
+            largest = max((max(cycle) for cycle in cycles if cycle), default=base - 1)
+            n = largest - base + 1
+        images = array("q", range(n))
+        inverse = array("q", range(n))
+        for cycle in reversed(cycles):
+            cycle = [point - base for point in cycle]
+            # Applying a -> b after the product so far changes only the point sent to a
+            sources = [inverse[a] for a in cycle]
+            for i, b in zip(sources, cycle[1:] + cycle[:1]):
+                images[i] = b
+                inverse[b] = i
+        return Permutation(images, check=False)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __getitem__(self, i: int) -> int:
+        return self.images[i]
+
+    __call__ = __getitem__
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Permutation) and self.images == other.images
+
+    def __hash__(self) -> int:
+        return hash(self.images.tobytes())
+
+    def __repr__(self) -> str:
+        return f"Permutation({self.cycle_notation()}, n={len(self)})"
+
+    def compose(self, other: "Permutation") -> "Permutation":
+        """self * other, the permutation i -> self(other(i))."""
+        if len(self) != len(other):
+            raise ValueError(
+                f"Cannot compose permutations of {len(self)} and {len(other)} points"
+            )
+        images = array("q", map(self.images.__getitem__, other.images))
+        return Permutation(images, check=False)
+
+    __mul__ = compose
+
+    def inverse(self) -> "Permutation":
+        result = array("q", bytes(8 * len(self)))
+        for i, image in enumerate(self.images):
+            result[image] = i
+        return Permutation(result, check=False)
+
+    def conjugate(self, alpha: "Permutation") -> "Permutation":
+        """
+        alpha * self * alpha^-1, which sends alpha(i) to alpha(self(i)): every cycle of self
+        with its points relabelled by alpha, so the cycle type is unchanged.
+        """
+        if len(self) != len(alpha):
+            raise ValueError(
+                f"Cannot conjugate by a permutation of {len(alpha)} points"
+            )
+        result = array("q", bytes(8 * len(self)))
+        for a, image in zip(alpha.images, map(alpha.images.__getitem__, self.images)):
+            result[a] = image
+        return Permutation(result, check=False)
+
+    def cycles(self, fixed_points: bool = True) -> list[list[int]]:
+        """Disjoint cycles, each starting at its smallest point, ordered by that point."""
+        seen = bytearray(len(self))
+        images = self.images
+        result = []
+        for start in range(len(images)):
+            if seen[start]:
+                continue
+            cycle = [start]
+            seen[start] = 1
+            point = images[start]
+            while point != start:
+                cycle.append(point)
+                seen[point] = 1
+                point = images[point]
+            if fixed_points or len(cycle) > 1:
+                result.append(cycle)
+        return result
+
+    def cycle_notation(self, base: int = 0, fixed_points: bool = True) -> str:
+        """
+        E.g. "(1 7 5 8 9)(2 3 4)(6)" with base=1. Without fixed points, the identity is
+        written "()".
+        """
+        cycles = self.cycles(fixed_points)
+        if not cycles:
+            return "()"
+        labels = (" ".join(str(point + base) for point in cycle) for cycle in cycles)
+        return "".join(f"({label})" for label in labels)
+
+    def cycle_type(self) -> list[int]:
+        """Cycle lengths (fixed points included) in decreasing order, e.g. [5, 3, 1]."""
+        return sorted(map(len, self.cycles()), reverse=True)
+
+    def transpositions(self) -> list[tuple[int, int]]:
+        """
+        A product of transpositions equal to self, applied right to left: each cycle
+        (a1 a2 ... ak) becomes (a1 ak)...(a1 a3)(a1 a2).
+        """
+        result = []
+        for cycle in self.cycles(fixed_points=False):
+            result.extend((cycle[0], point) for point in reversed(cycle[1:]))
+        return result
+
+    def sign(self) -> int:
+        """+1 for an even permutation, -1 for an odd one: a k-cycle is k - 1 transpositions."""
+        return -1 if (len(self) - len(self.cycles())) % 2 else 1
+
+    def is_involution(self) -> bool:
+        """True if self * self is the identity, i.e. all cycles have length 1 or 2."""
+        images = self.images
+        return all(map(eq, map(images.__getitem__, images), range(len(images))))
+
+    def order(self) -> int:
+        """The smallest k > 0 with self^k the identity: the lcm of the cycle lengths."""
+        return lcm(*map(len, self.cycles()))
+
+    def power(self, k: int) -> "Permutation":
+        """
+        self^k for any integer k (negative k gives powers of the inverse), from the cycle
+        structure: each point moves k steps along its own cycle, so the cost is O(n)
+        however large k is.
+        """
+        result = array("q", bytes(8 * len(self)))
+        for cycle in self.cycles():
+            shift = k % len(cycle)
+            for a, b in zip(cycle, cycle[shift:] + cycle[:shift]):
+                result[a] = b
+        return Permutation(result, check=False)
+
+    __pow__ = power
+
+    def apply(self, text):
+        """
+        Rearrange a sequence by gathering: result[i] = text[self(i)], the same as the
+        gather index arrays in HW1/Permutation_Cipher.py. Works on str, bytes and lists.
+        """
+        if len(text) != len(self):
+            raise ValueError(
+                f"Text of length {len(text)} does not match {len(self)} points"
+            )
+        picked = map(text.__getitem__, self.images)
+        if isinstance(text, str):
+            return "".join(picked)
+        if isinstance(text, (bytes, bytearray)):
+            return bytes(picked)
+        return list(picked)
+
+
+def solve_problem_2():
+    sigma = Permutation([6, 2, 3, 1, 7, 5, 4, 8, 0])
+    print("Problem 2:")
+    print(f"(a) sigma = {sigma.cycle_notation(base=1)}")
+    print(f"(b) cycle type = {sigma.cycle_type()}")
+    transpositions = "".join(f"({a + 1} {b + 1})" for a, b in sigma.transpositions())
+    print(f"(c) sigma = {transpositions}")
+    print(f"(d) {'even' if sigma.sign() == 1 else 'odd'} permutation")
+    print(f"(e) involution: {sigma.is_involution()}")
+
+    alpha = Permutation.from_cycles([[1, 4, 8, 5], [1, 3, 6, 7], [2, 9]], 9, base=1)
+    conjugate = sigma.conjugate(alpha)
+    print(f"(f) alpha = {alpha.cycle_notation(base=1, fixed_points=False)}")
+    print(f"    alpha sigma alpha^-1 = {conjugate.cycle_notation(base=1)}")
+    product = sigma * conjugate
+    print(f"(g) sigma alpha sigma alpha^-1 = {product.cycle_notation(base=1)}")
+    print(f"    cycle type {product.cycle_type()}")
+
+
+def test_permutation():
+    print("\nTesting permutations:")
+    n = 1_000_000
+    p = Permutation([(i * 7919 + 13) % n for i in range(n)])  # gcd(7919, 10^6) = 1
+    q = Permutation(array("q", range(n - 1, -1, -1)))
+
+    start = time.perf_counter()
+    pq = p * q
+    inverse = p.inverse()
+    cycle_type = p.cycle_type()
+    big_power = p ** (10**18 + 3)
+    conjugate = p.conjugate(q)
+    elapsed = time.perf_counter() - start
+
+    print(f"n = {n}: compose, inverse, cycle type, power, conjugate in {elapsed:.2f}s")
+    print(f"p * p^-1 is the identity: {p * inverse == Permutation.identity(n)}")
+    print(f"(p * q)(5) == p(q(5)): {pq(5) == p(q(5))}")
+
+    # Composition order of gathers on a small example: apply p, then q
+    small_p = Permutation([1, 2, 0, 3])
+    small_q = Permutation([3, 2, 1, 0])
+    text = "abcd"
+    twice = small_q.apply(small_p.apply(text))
+    pq_gather = (small_p * small_q).apply(text)
+    qp_gather = (small_q * small_p).apply(text)
+    print(f"q.apply(p.apply({text!r})) = {twice!r}, (p * q).apply = {pq_gather!r}")
+    print(f"    one gather with p * q: {twice == pq_gather}, with q * p: {twice == qp_gather}")
+    print(f"cycle type of p: {cycle_type[:5]}{'...' if len(cycle_type) > 5 else ''}")
+    print(f"order {p.order()}, sign {p.sign()}")
+    print(f"conjugate has the same cycle type: {conjugate.cycle_type() == cycle_type}")
+    reduced = p.power((10**18 + 3) % p.order())
+    print(f"p^(10^18 + 3) == p^((10^18 + 3) mod order): {big_power == reduced}")
+
+
+if __name__ == "__main__":
+    solve_problem_2()
+    test_permutation()
@@ -0,0 +1,350 @@
+"""
+English n-gram fitness model shared by the cipher solvers.
+
+The n-gram statistics are trained from english_corpus.txt (public-domain English prose).
+Scores are sums of log10 probabilities, so higher (less negative) means more English-like.
+The solver tests encrypt held_out_text.txt, original prose that is not in the corpus, so
+they never decrypt text the model was trained on.
+
+Trained models are stored in a binary file that is opened with mmap, so every process
+(and playfaircrack's scoreText.c) shares one copy of the tables with no parsing:
+
+    header    b"NGRM", uint32 version, uint32 order, float64 random_mean, float64 english_mean
+    tables    for k = 1 to order: 26^k float32 log10 P(k-gram)
+
+All fields are little-endian.
+"""
+
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_corpus.txt")
+HELD_OUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "held_out_text.txt")
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_ngrams.bin")
+
+_MAGIC = b"NGRM"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIIdd")
+
+# Standard English letter frequencies in percent, for the frequency-matching analyzers.
+# The training corpus is too small to beat these, but a model trained on a large corpus
+# (of any language) gives its own through NgramModel.letter_frequencies().
+ENGLISH_LETTER_FREQ = {
+    "A": 8.167,
+    "B": 1.492,
+    "C": 2.782,
+    "D": 4.253,
+    "E": 12.702,
+    "F": 2.228,
+    "G": 2.015,
+    "H": 6.094,
+    "I": 6.966,
+    "J": 0.153,
+    "K": 0.772,
+    "L": 4.025,
+    "M": 2.406,
+    "N": 6.749,
+    "O": 7.507,
+    "P": 1.929,
+    "Q": 0.095,
+    "R": 5.987,
+    "S": 6.327,
+    "T": 9.056,
+    "U": 2.758,
+    "V": 0.978,
+    "W": 2.360,
+    "X": 0.150,
+    "Y": 1.974,
+    "Z": 0.074,
+}
+
+# bytes.translate tables: keep only ASCII letters, then map A-Z / a-z to 0-25
+_NON_LETTERS = bytes(c for c in range(256) if not chr(c).isalpha() or c >= 128)
+_TO_INDEX = bytes.maketrans(
+    (ALPHABET + ALPHABET.lower()).encode(), bytes(range(26)) * 2
+)
+
+# Interpolation weight given to the higher-order count at each order (Jelinek-Mercer smoothing)
+_LAMBDA = {2: 0.7, 3: 0.6, 4: 0.5}
+
+
+def encode(text):
+    """Convert text (str or bytes) to a bytes object of letter indices 0-25, dropping non-letters."""
+    if isinstance(text, str):
+        text = text.encode("ascii", "ignore")
+    return bytes(text).translate(None, _NON_LETTERS).translate(_TO_INDEX)
+
+
+class NgramModel:
+    def __init__(self, corpus, order=4):
+        """Train log10 n-gram tables of order 1 to order on the letters of corpus."""
+        self.order = order
+        letters = encode(corpus)
+
+        # counts[k][i] = occurrences of the k-gram with base-26 index i
+        counts = [None]
+        for k in range(1, order + 1):
+            table = array("l", [0]) * 26**k
+            idx = 0
+            size = 26**k
+            for i, c in enumerate(letters):
+                idx = (idx * 26 + c) % size
+                if i >= k - 1:
+                    table[idx] += 1
+            counts.append(table)
+
+        # log_probs[k][i] = log10 P(k-gram i), built as P(x1) P(x2|x1) ... with each
+        # conditional interpolated with the next lower order so unseen n-grams keep some mass
+        total = sum(counts[1])
+        cond = array("d", ((c + 1) / (total + 26) for c in counts[1]))
+        self.log_probs = [None, array("d", (math.log10(p) for p in cond))]
+        for k in range(2, order + 1):
+            lam = _LAMBDA.get(k, 0.5)
+            lower = cond
+            lower_size = 26 ** (k - 2)
+            prev_log = self.log_probs[k - 1]
+            cond = array("d", [0.0]) * 26**k
+            log_table = array("d", [0.0]) * 26**k
+            kcounts = counts[k]
+            for prefix in range(26 ** (k - 1)):
+                base = prefix * 26
+                prefix_total = sum(kcounts[base : base + 26])
+                lower_base = (prefix % lower_size) * 26
+                prefix_log = prev_log[prefix]
+                for x in range(26):
+                    p = lower[lower_base + x]
+                    if prefix_total:
+                        p = lam * kcounts[base + x] / prefix_total + (1 - lam) * p
+                    cond[base + x] = p
+                    log_table[base + x] = prefix_log + math.log10(p)
+            self.log_probs.append(log_table)
+
+        # Reference points for confidence(): average quadgram score of uniformly random
+        # letters and of the training text itself
+        table = self.log_probs[order]
+        self.random_mean = sum(table) / len(table)
+        self.english_mean = self.score(letters, encoded=True) / max(1, len(letters) - order + 1)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """
+        Open a model file written by save. The tables are float32 views straight into the
+        memory-mapped file, so loading costs nothing and the pages are shared between
+        processes that open the same file. On a big-endian machine the tables are copied
+        and byteswapped instead.
+        """
+        model = cls.__new__(cls)
+        with open(path, "rb") as f:
+            model._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, order, random_mean, english_mean = _HEADER.unpack_from(model._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not an n-gram model file")
+        model.order = order
+        model.random_mean = random_mean
+        model.english_mean = english_mean
+        model.log_probs = [None]
+        offset = _HEADER.size
+        view = memoryview(model._map)
+        for k in range(1, order + 1):
+            size = 4 * 26**k
+            if sys.byteorder == "little":
+                model.log_probs.append(view[offset : offset + size].cast("f"))
+            else:
+                table = array("f")
+                table.frombytes(view[offset : offset + size])
+                table.byteswap()
+                model.log_probs.append(table)
+            offset += size
+        return model
+
+    def save(self, path=MODEL_PATH):
+        """
+        Write the tables to a model file (see the module docstring for the layout). The file
+        is written under a temporary name and then renamed over path, so a process opening
+        path (e.g. a pool worker building the same model) never maps a half-written file.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, self.order, self.random_mean, self.english_mean))
+                for k in range(1, self.order + 1):
+                    table = array("f", self.log_probs[k])
+                    if table.itemsize != 4:
+                        raise RuntimeError("float32 arrays are required to write a model file")
+                    if sys.byteorder == "big":
+                        table.byteswap()
+                    f.write(table.tobytes())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def letter_frequencies(self):
+        """Letter frequencies in percent from the unigram table, shaped like ENGLISH_LETTER_FREQ."""
+        return {c: 100 * 10 ** p for c, p in zip(ALPHABET, self.log_probs[1])}
+
+    def score(self, text, encoded=False):
+        """Sum of log10 n-gram probabilities over every n-gram of text."""
+        letters = text if encoded else encode(text)
+        k = min(self.order, len(letters))
+        if k == 0:
+            return 0.0
+        table = self.log_probs[k]
+        size = 26**k
+        idx = 0
+        for c in letters[: k - 1]:
+            idx = idx * 26 + c
+        score = 0.0
+        for c in letters[k - 1 :]:
+            idx = (idx * 26 + c) % size
+            score += table[idx]
+        return score
+
+    def confidence(self, text, encoded=False):
+        """
+        How English-like text is on a linear scale where 0 is uniformly random letters and
+        1 is the training corpus. Short texts are noisy, so treat this as a rough guide.
+        """
+        letters = text if encoded else encode(text)
+        if len(letters) < self.order:
+            return 0.0
+        mean = self.score(letters, encoded=True) / (len(letters) - self.order + 1)
+        return (mean - self.random_mean) / (self.english_mean - self.random_mean)
+
+
+def encode_batch(texts):
+    """
+    Stack candidate texts of the same letter count into a batch: a bytes object of letter
+    indices holding one row per text, back to back. Returns (batch, row_length).
+    """
+    rows = [encode(text) for text in texts]
+    row_length = len(rows[0]) if rows else 0
+    if any(len(row) != row_length for row in rows):
+        raise ValueError("All texts in a batch must have the same number of letters")
+    return b"".join(rows), row_length
+
+
+def _window_codes(batch, k):
+    """
+    Base-26 index of the k-gram starting at every position of batch. Each letter gets a
+    32-bit lane of one big integer, so k - 1 shift-multiply-adds compute every index at
+    once (26^k fits a lane up to k = 6); indices of windows that run off a row are junk.
+    """
+    lanes = bytearray(4 * len(batch))
+    lanes[0::4] = batch
+    letters = int.from_bytes(lanes, "little")
+    codes = letters
+    for _ in range(k - 1):
+        letters >>= 32
+        codes = codes * 26 + letters
+    result = array("I", codes.to_bytes(len(lanes), "little"))
+    if sys.byteorder == "big":
+        result.byteswap()
+    return result
+
+
+def quadgram_scores(batch, row_length, model=None):
+    """
+    model.score of every row of a batch (see encode_batch), from one pass of strided
+    n-gram indexing over the whole batch and a C-level sum of table lookups per row.
+    """
+    model = model or english_model()
+    rows = len(batch) // row_length if row_length else 0
+    k = min(model.order, row_length)
+    if k == 0:
+        return [0.0] * rows
+    codes = _window_codes(batch, k)
+    lookup = model.log_probs[k].__getitem__
+    windows = row_length - k + 1
+    starts = range(0, rows * row_length, row_length)
+    return [sum(map(lookup, codes[start : start + windows])) for start in starts]
+
+
+def chi_square_scores(batch, row_length, frequencies=ENGLISH_LETTER_FREQ):
+    """Chi-square statistic of the letter counts of every row against frequencies (in percent)."""
+    expected = [row_length * frequencies[c] / 100 for c in ALPHABET]
+    scores = []
+    for start in range(0, len(batch) - row_length + 1, row_length):
+        row = batch[start : start + row_length]
+        scores.append(sum((o - e) ** 2 / e for o, e in zip(map(row.count, range(26)), expected)))
+    return scores
+
+
+def ioc_scores(batch, row_length):
+    """Index of coincidence of every row."""
+    pairs = row_length * (row_length - 1) or 1
+    scores = []
+    for start in range(0, len(batch) - row_length + 1, row_length):
+        row = batch[start : start + row_length]
+        scores.append(sum(c * (c - 1) for c in map(row.count, range(26))) / pairs)
+    return scores
+
+
+def score_batch(texts, model=None):
+    """
+    Score many same-length candidate plaintexts at once. Returns a dict of lists, one
+    entry per text: "quadgram" (model score, higher is better), "chi_square" (lower is
+    better) and "ioc" (about 0.066 for English).
+    """
+    batch, row_length = encode_batch(texts)
+    return {
+        "quadgram": quadgram_scores(batch, row_length, model),
+        "chi_square": chi_square_scores(batch, row_length),
+        "ioc": ioc_scores(batch, row_length),
+    }
+
+
+_default_model = None
+
+
+def build_model_file(corpus_path=CORPUS_PATH, path=MODEL_PATH, order=4):
+    """Train a model on the text file at corpus_path, save it to path and return it."""
+    with open(corpus_path, encoding="utf-8") as f:
+        model = NgramModel(f.read(), order)
+    model.save(path)
+    return model
+
+
+def english_model():
+    """
+    Return the shared model: the one chosen with set_model, or else the model file at
+    MODEL_PATH, which is built from english_corpus.txt first if it is missing or older
+    than the corpus.
+    """
+    global _default_model
+    if _default_model is None:
+        if not os.path.exists(MODEL_PATH) or os.path.getmtime(MODEL_PATH) < os.path.getmtime(CORPUS_PATH):
+            build_model_file()
+        _default_model = NgramModel.load(MODEL_PATH)
+    return _default_model
+
+
+def set_model(model):
+    """
+    Switch the shared model at runtime, e.g. to another language or corpus. model is an
+    NgramModel or the path of a model file; None goes back to the default.
+    """
+    global _default_model
+    _default_model = NgramModel.load(model) if isinstance(model, str) else model
+
+
+def test_fitness():
+    model = english_model()
+    texts = [
+        "MARYMARYQUITECONTRARYHOWDOESYOURGARDENGROW",
+        "MYAMRARUYIQTENCTORAHROYWDSOYEOUARRGDERNOGW",
+        "QZXJKVBPQWZXJQKVZBXPQJWKZVXQBJPKZWVXQJBKPZ",
+    ]
+    print("Testing English fitness:")
+    for text in texts:
+        print(f"{text}: score = {model.score(text):.2f}, confidence = {model.confidence(text):.2f}")
+
+
+if __name__ == "__main__":
+    test_fitness()
@@ -0,0 +1,317 @@
+"""
+Python driver for the simulated annealing Playfair cracker in playfaircrack.c.
+
+The C program runs forever on a hardcoded ciphertext. This module loads the same
+playfairCrack / playfairDecipher / scoreTextQgram routines from a shared library with
+ctypes and runs independent, seeded restarts on every core. It stops at a target score,
+after a number of restarts without improvement, or when a restart or time budget runs
+out, and reports progress as a stream of events.
+
+Build the library once next to the sources:
+
+    cc -O2 -shared -fPIC -o libplayfaircrack.so playfaircrack.c scoreText.c -lm
+
+or call build_library(). It scores with the quadgram table of model_path, by default the
+n-gram model file of fitness/English_Fitness.py (built from its corpus on first use). With
+qgr.h, the quadgram table from practicalcryptography.com, the library can instead be built
+with builtin_table=True (-DBUILTIN_QGRAM) and loaded with model_path=None to score with
+that table.
+"""
+
+import ctypes
+import os
+import queue
+import random
+import re
+import subprocess
+import time
+import sys
+from multiprocessing import Pool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fitness"))
+from English_Fitness import MODEL_PATH, english_model
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_PATH = os.path.join(SOURCE_DIR, "libplayfaircrack.so")
+SOURCES = ("playfaircrack.c", "scoreText.c")
+
+# Default annealing schedule, the TEMP / STEP / COUNT #defines of playfaircrack.c
+TEMP = 20.0
+STEP = 0.2
+COUNT = 10000
+
+# The hardcoded ciphertext of playfaircrack.c
+EXAMPLE_CIPHERTEXT = (
+    "VWRDGHIMIFFKDOYPOLMWZFWHDBGTTZVWTMSOEDXESEEINDWHHNGTTZNHZTNHZTHQHYLNZHCQINSTNPWIZ"
+    "XVKKVOLEPCQELHTOIIGZTNIEZVDVANTYTTGDPOG"
+)
+
+
+def build_library(path=LIBRARY_PATH, compiler="cc", builtin_table=False):
+    """
+    Compile playfaircrack.c and scoreText.c into a shared library at path. By default it
+    has no quadgram table of its own and a model file must be loaded to score; with
+    builtin_table=True qgr.h (not included here) is compiled in.
+    """
+    command = [compiler, "-O2", "-shared", "-fPIC", "-o", path, *SOURCES, "-lm"]
+    if builtin_table:
+        command.insert(1, "-DBUILTIN_QGRAM")
+    subprocess.run(command, cwd=SOURCE_DIR, check=True)
+    return path
+
+
+def load_library(path=LIBRARY_PATH, model_path=MODEL_PATH):
+    """
+    Load the shared library and declare the C signatures of the routines used here, and
+    score with the quadgram table of the model file at model_path (the default model is
+    built first if needed). A relative model_path is taken from the current directory
+    and passed to the library as an absolute path. model_path=None keeps the qgr.h table
+    of a builtin_table build.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} does not exist, build it with build_library()")
+    lib = ctypes.CDLL(path)
+    lib.playfairCrack.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_double,
+        ctypes.c_double,
+        ctypes.c_int,
+    ]
+    lib.playfairCrack.restype = ctypes.c_float
+    lib.playfairDecipher.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_int,
+    ]
+    lib.playfairDecipher.restype = ctypes.c_char_p
+    lib.scoreTextQgram.argtypes = [ctypes.c_char_p, ctypes.c_int]
+    lib.scoreTextQgram.restype = ctypes.c_double
+    lib.playfairSeed.argtypes = [ctypes.c_uint]
+    lib.playfairSeed.restype = None
+    lib.playfairRandomKey.argtypes = [ctypes.c_char_p]
+    lib.playfairRandomKey.restype = ctypes.c_char_p
+    lib.scoreLoadModel.argtypes = [ctypes.c_char_p]
+    lib.scoreLoadModel.restype = ctypes.c_int
+    if model_path is None:
+        return lib
+    model_path = os.path.abspath(model_path)
+    if model_path == MODEL_PATH:
+        english_model()
+    if lib.scoreLoadModel(os.fsencode(model_path)) != 0:
+        raise ValueError(f"{model_path} is not an n-gram model file of order 4 or more")
+    return lib
+
+
+def prepare_ciphertext(text):
+    """
+    Reduce text to what the C code expects: uppercase A-Z without J (J becomes I), and
+    an even number of letters.
+    """
+    letters = re.sub(r"[^A-Z]", "", text.upper()).replace("J", "I")
+    if len(letters) % 2:
+        raise ValueError(f"Playfair ciphertext must have an even number of letters, got {len(letters)}")
+    return letters.encode("ascii")
+
+
+def decipher(lib, key, ciphertext):
+    """Decrypt prepared ciphertext (bytes) with a 25-letter key square."""
+    out = ctypes.create_string_buffer(len(ciphertext) + 1)
+    lib.playfairDecipher(key.encode("ascii"), ciphertext, out, len(ciphertext))
+    return out.value.decode("ascii")
+
+
+def score_text(lib, text):
+    """Quadgram score of uppercase A-Z text from scoreTextQgram."""
+    data = text.encode("ascii")
+    return lib.scoreTextQgram(data, len(data))
+
+
+_library = None
+
+
+def _init_worker(path, model_path):
+    global _library
+    _library = load_library(path, model_path)
+
+
+def _restart(args):
+    """Pool worker: one annealing run from a random key seeded by seed."""
+    ciphertext, seed, temp, step, count = args
+    start = time.perf_counter()
+    _library.playfairSeed(seed)
+    key = ctypes.create_string_buffer(26)
+    _library.playfairRandomKey(key)
+    score = _library.playfairCrack(ciphertext, len(ciphertext), key, temp, step, count)
+    return seed, score, key.value.decode("ascii"), time.perf_counter() - start
+
+
+def run(
+    ciphertext,
+    temp=TEMP,
+    step=STEP,
+    count=COUNT,
+    seed=None,
+    restarts=None,
+    time_limit=None,
+    target_score=None,
+    plateau=None,
+    processes=None,
+    library_path=LIBRARY_PATH,
+    model_path=MODEL_PATH,
+):
+    """
+    Run independent annealing restarts in parallel and yield progress events (dicts):
+
+        {"event": "restart", "restart", "seed", "score", "key", "seconds", "best_score", "elapsed"}
+        {"event": "best", "restart", "score", "key", "plaintext", "elapsed"}
+        {"event": "done", "reason", "restarts", "score", "key", "plaintext", "elapsed"}
+
+    Restart i is seeded with seed + i, so a run can be repeated (seed=None picks one at
+    random). The run stops when the best score reaches target_score, after plateau
+    restarts in a row without improvement, after restarts restarts, or after time_limit
+    seconds, whichever comes first ("target", "plateau", "restarts" or "time"); with none
+    of these it runs until the caller stops iterating. Restarts still running when it
+    stops are killed. model_path is the model file the workers score with (see
+    load_library).
+    """
+    # playfairCrack cools from temp in steps of step, so a step <= 0 never finishes
+    if step <= 0:
+        raise ValueError(f"step must be positive, got {step}")
+    if count < 0:
+        raise ValueError(f"count must not be negative, got {count}")
+    lib = load_library(library_path, model_path)
+    text = prepare_ciphertext(ciphertext)
+    if seed is None:
+        seed = random.randrange(2**32)
+    processes = processes or os.cpu_count() or 1
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    start = time.perf_counter()
+
+    finished = queue.Queue()
+    submitted = done = since_best = 0
+    best_score, best_key = float("-inf"), None
+    reason = None
+
+    with Pool(processes, initializer=_init_worker, initargs=(library_path, model_path)) as pool:
+
+        def submit():
+            nonlocal submitted
+            task = (text, (seed + submitted) % 2**32, temp, step, count)
+            pool.apply_async(_restart, (task,), callback=finished.put, error_callback=finished.put)
+            submitted += 1
+
+        for _ in range(processes if restarts is None else min(restarts, processes)):
+            submit()
+
+        while reason is None:
+            timeout = None if deadline is None else deadline - time.perf_counter()
+            try:
+                if timeout is not None and timeout <= 0:
+                    raise queue.Empty
+                result = finished.get(timeout=timeout)
+            except queue.Empty:
+                reason = "time"
+                break
+            if isinstance(result, BaseException):
+                raise result
+
+            done += 1
+            restart_seed, score, key, seconds = result
+            improved = score > best_score
+            if improved:
+                best_score, best_key = score, key
+                since_best = 0
+            else:
+                since_best += 1
+            elapsed = time.perf_counter() - start
+            yield {
+                "event": "restart",
+                "restart": done,
+                "seed": restart_seed,
+                "score": score,
+                "key": key,
+                "seconds": seconds,
+                "best_score": best_score,
+                "elapsed": elapsed,
+            }
+            if improved:
+                yield {
+                    "event": "best",
+                    "restart": done,
+                    "score": score,
+                    "key": key,
+                    "plaintext": decipher(lib, key, text),
+                    "elapsed": elapsed,
+                }
+
+            if target_score is not None and best_score >= target_score:
+                reason = "target"
+            elif plateau is not None and since_best >= plateau:
+                reason = "plateau"
+            elif restarts is not None and done >= restarts:
+                reason = "restarts"
+            elif restarts is None or submitted < restarts:
+                submit()
+
+    yield {
+        "event": "done",
+        "reason": reason,
+        "restarts": done,
+        "score": best_score,
+        "key": best_key,
+        "plaintext": None if best_key is None else decipher(lib, best_key, text),
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def crack(ciphertext, on_event=None, **options):
+    """
+    Run to completion (see run for the options) and return (score, key, plaintext) of the
+    best restart. on_event, if given, is called with every progress event.
+    """
+    for event in run(ciphertext, **options):
+        if on_event is not None:
+            on_event(event)
+    return event["score"], event["key"], event["plaintext"]
+
+
+def benchmark(ciphertext=EXAMPLE_CIPHERTEXT, keys=500_000, seed=1, library_paths=(LIBRARY_PATH,), model_path=MODEL_PATH):
+    """
+    Keys tried per second by playfairCrack (modify key, decipher, score, accept or not),
+    run at temperature 0 so the schedule is a single step of keys tries. Pass several
+    library paths to compare builds, e.g. one compiled from an older playfaircrack.c.
+    Returns {path: keys per second}.
+    """
+    text = prepare_ciphertext(ciphertext)
+    rates = {}
+    for path in library_paths:
+        lib = load_library(path, model_path)
+        lib.playfairSeed(seed)
+        key = ctypes.create_string_buffer(26)
+        lib.playfairRandomKey(key)
+        start = time.perf_counter()
+        lib.playfairCrack(text, len(text), key, 0.0, 1.0, keys)
+        rates[path] = keys / (time.perf_counter() - start)
+        print(f"{path}: {rates[path]:,.0f} keys/sec")
+    return rates
+
+
+def test_runner():
+    print("Testing playfaircrack runner:")
+
+    def report(event):
+        if event["event"] == "best":
+            print(f"restart {event['restart']} ({event['elapsed']:.1f}s): score {event['score']:.2f}, key {event['key']}")
+            print(f"    plaintext: {event['plaintext']}")
+        elif event["event"] == "done":
+            print(f"Stopped ({event['reason']}) after {event['restarts']} restarts in {event['elapsed']:.1f}s")
+
+    score, key, plaintext = crack(EXAMPLE_CIPHERTEXT, on_event=report, seed=1, plateau=8, time_limit=120)
+    print(f"Best: score {score:.2f}, key {key}\n    plaintext: {plaintext}")
+
+
+if __name__ == "__main__":
+    test_runner()
@@ -8,10 +8,17 @@
 #define TEMP 20
 #define STEP 0.2
 #define COUNT 10000
+// n-gram model scored with when none is given, relative to the directory of the executable
+#define DEFAULT_MODEL "../fitness/english_ngrams.bin"
 
 char *playfairDecipher(char *key, char *in,char *out, int len);
-float playfairCrack(char *text,int len, char* maxKey);
+char *playfairDecipherPos(char *key, int *pos, char *in, char *out, int len);
+void keyPositions(char *key, int *pos);
+float playfairCrack(char *text,int len, char* maxKey, double startTemp, double step, int count);
+void playfairSeed(unsigned seed);
+char *playfairRandomKey(char *key);
 static char *shuffleKey(char *in);
+static char *defaultModelPath(const char *argv0);
 
 int main(int argc, char *argv[])
 {
@@ -20,20 +27,37 @@ int main(int argc, char *argv[])
 
     // THINGS TO ENSURE: CIPHER AND KEY MUST BE UPPERCASE, CONSISTING ONLY OF LETTERS A-Z, AND NO OTHERS. YOU CAN SPELL OUT NUMBERS IF YOU NEED TO.
     // NEITHER THE CIPHER OR THE KEY SHOULD HAVE THE LETTER 'J' IN IT. IT WILL CRASH IF YOU DO NOT DO THESE THINGS. THIS IS A PROOF OF CONCEPT ONLY.
-    char cipher[]  = "VWRDGHIMIFFKDOYPOLMWZFWHDBGTTZVWTMSOEDXESEEINDWHHNGTTZNHZTNHZTHQHYLNZHCQINSTNPWIZXVKKVOLEPCQELHTOIIGZTNIEZVDVANTYTTGDPOG";
+    // usage: playfaircrack [CIPHERTEXT [SEED [ITERATIONS [MODEL]]]], ITERATIONS = 0 runs until killed,
+    // MODEL is an n-gram model file from fitness/English_Fitness.py to score with (default DEFAULT_MODEL,
+    // or qgr.h in a build with -DBUILTIN_QGRAM)
+    // build: cc -O2 -o playfaircrack playfaircrack.c scoreText.c -lm
+    char *cipher = "VWRDGHIMIFFKDOYPOLMWZFWHDBGTTZVWTMSOEDXESEEINDWHHNGTTZNHZTNHZTHQHYLNZHCQINSTNPWIZXVKKVOLEPCQELHTOIIGZTNIEZVDVANTYTTGDPOG";
+    if(argc > 1) cipher = argv[1];
     int len = strlen(cipher);  
     char *out = malloc(sizeof(char)*(len+1));
-    srand((unsigned)time(NULL)); // randomise the seed, so we get different results each time we run this program
+    if(argc > 2) playfairSeed((unsigned)strtoul(argv[2], NULL, 10));
+    else srand((unsigned)time(NULL)); // randomise the seed, so we get different results each time we run this program
+    int iterations = argc > 3 ? atoi(argv[3]) : 0;
+    char *model = argc > 4 ? argv[4] : defaultModelPath(argv[0]);
+#ifdef BUILTIN_QGRAM
+    if(argc > 4 && scoreLoadModel(model) != 0){
+#else
+    if(scoreLoadModel(model) != 0){
+#endif
+        printf("could not load n-gram model '%s' (build it with python ../fitness/English_Fitness.py)\n", model);
+        return 1;
+    }
+    if(argc <= 4) free(model);
 
     printf("Running playfaircrack, this could take a few minutes...\n");
 
     char key[] = "ABCDEFGHIKLMNOPQRSTUVWXYZ";
     int i=0;
     double score,maxscore=-99e99;
-    // run until user kills it
-    while(1){
+    // run until user kills it, or for the given number of iterations
+    while(iterations == 0 || i < iterations){
         i++;
-        score = playfairCrack(cipher,len,key);
+        score = playfairCrack(cipher,len,key,TEMP,STEP,COUNT);
         if(score > maxscore){
             maxscore = score;
             printf("best score so far: %f, on iteration %d\n",score,i);
@@ -46,15 +70,48 @@ int main(int argc, char *argv[])
     return 0;
 }
 
-void exchange2letters(char *key){
+/* DEFAULT_MODEL next to the executable named by argv0, so the program can be run from any
+   directory (relative to the current directory if argv0 has no directory, i.e. it was found
+   on the PATH). The result is malloc'ed. */
+static char *defaultModelPath(const char *argv0){
+    const char *slash = strrchr(argv0, '/');
+    int dirLen = slash ? (int)(slash - argv0) + 1 : 0;
+    char *path = malloc(dirLen + strlen(DEFAULT_MODEL) + 1);
+    memcpy(path, argv0, dirLen);
+    strcpy(path + dirLen, DEFAULT_MODEL);
+    return path;
+}
+
+/* seed rand(), so a run (or one restart of a parallel run) can be repeated exactly */
+void playfairSeed(unsigned seed){
+    srand(seed);
+}
+
+/* fill key with a random arrangement of the 25 letters, as a fresh starting point */
+char *playfairRandomKey(char *key){
+    strcpy(key,"ABCDEFGHIKLMNOPQRSTUVWXYZ");
+    return shuffleKey(key);
+}
+
+/* pos[c - 'A'] is the index of letter c in the key square. Each key carries its position
+   table, and the key modifications below update only the entries of the letters they move,
+   so deciphering never has to search the key for a letter. */
+void keyPositions(char *key, int *pos){
+    int k;
+    for(k=0;k<25;k++) pos[key[k] - 'A'] = k;
+}
+
+void exchange2letters(char *key, int *pos){
     int i = rand()%25;
     int j = rand()%25;
     char temp = key[i];
     key[i]= key[j];
     key[j] = temp;
+    pos[key[i] - 'A'] = i;
+    pos[key[j] - 'A'] = j;
 }
 
-void swap2rows(char *key){
+void swap2rows(char *key, int *pos){
     int i = rand()%5;
     int j = rand()%5;
     char temp;
@@ -63,10 +120,12 @@ void swap2rows(char *key){
         temp = key[i*5 + k];
         key[i*5 + k] = key[j*5 + k];
         key[j*5 + k] = temp;
+        pos[key[i*5 + k] - 'A'] = i*5 + k;
+        pos[key[j*5 + k] - 'A'] = j*5 + k;
     }
 }
 
-void swap2cols(char *key){
+void swap2cols(char *key, int *pos){
     int i = rand()%5;
     int j = rand()%5;
     char temp;
@@ -75,56 +134,70 @@ void swap2cols(char *key){
         temp = key[k*5 + i];
         key[k*5 + i] = key[k*5 + j];
         key[k*5 + j] = temp;
+        pos[key[k*5 + i] - 'A'] = k*5 + i;
+        pos[key[k*5 + j] - 'A'] = k*5 + j;
     }
 }
 
 /* our key modification consists of several different modifications: swapping rows, cols, flipping the
    keysquare rows, flipping all cols and reversing the whole key. In addition to this, single letter
-   swaps are made. The letter swaps occur ~90% of the time. */
-void modifyKey(char *newKey,char *oldKey){
+   swaps are made. The letter swaps occur ~90% of the time. The flips move every letter, so they
+   rebuild the position table; the swaps update it in place. */
+void modifyKey(char *newKey,int *newPos,char *oldKey,int *oldPos){
     int k,j,i = rand()%50;
     switch(i){
-        case 0: strcpy(newKey,oldKey); swap2rows(newKey); break;
-        case 1: strcpy(newKey,oldKey); swap2cols(newKey); break;       
-        case 2: for(k=0;k<25;k++) newKey[k] = oldKey[24-k]; newKey[25] = '\0'; break; // reverse whole keysquare
+        case 0: strcpy(newKey,oldKey); memcpy(newPos,oldPos,26*sizeof(int)); swap2rows(newKey,newPos); break;
+        case 1: strcpy(newKey,oldKey); memcpy(newPos,oldPos,26*sizeof(int)); swap2cols(newKey,newPos); break;
+        case 2: for(k=0;k<25;k++) newKey[k] = oldKey[24-k]; newKey[25] = '\0'; // reverse whole keysquare
+                keyPositions(newKey,newPos);
+                break;
         case 3: for(k=0;k<5;k++) for(j=0;j<5;j++) newKey[k*5 + j] = oldKey[(4-k)*5+j]; // swap rows up-down
                 newKey[25] = '\0';
+                keyPositions(newKey,newPos);
                 break;
         case 4: for(k=0;k<5;k++) for(j=0;j<5;j++) newKey[j*5 + k] = oldKey[(4-j)*5+k]; // swap cols left-right
                 newKey[25] = '\0';
+                keyPositions(newKey,newPos);
                 break;
         default:strcpy(newKey,oldKey); 
-                exchange2letters(newKey);
+                memcpy(newPos,oldPos,26*sizeof(int));
+                exchange2letters(newKey,newPos);
     }
 }
 
 /* this is the bit that implements the simulated annealing algorithm */
-float playfairCrack(char *text,int len, char* bestKey){
-    int i,j,count;
+/* the schedule is: temperature from startTemp down to 0 in steps of step, count keys tried at each */
+float playfairCrack(char *text,int len, char* bestKey, double startTemp, double step, int count){
+    int i,j,n;
     float T;
     char temp, *deciphered = malloc(sizeof(char) * (len+1));
     char testKey[26];
     char maxKey[26];
+    int testPos[26];
+    int maxPos[26];
     double prob,dF,maxscore,score;
     double bestscore;
     strcpy(maxKey,bestKey);
-    playfairDecipher(maxKey,text,deciphered,len);
+    keyPositions(maxKey,maxPos);
+    playfairDecipherPos(maxKey,maxPos,text,deciphered,len);
     maxscore = scoreTextQgram(deciphered,len);
     bestscore = maxscore;
-    for(T = TEMP; T >= 0; T-=STEP){
-        for(count = 0; count < COUNT; count++){ 
-            modifyKey(testKey,maxKey);    
-            playfairDecipher(testKey,text,deciphered,len);
+    for(T = startTemp; T >= 0; T-=step){
+        for(n = 0; n < count; n++){ 
+            modifyKey(testKey,testPos,maxKey,maxPos);
+            playfairDecipherPos(testKey,testPos,text,deciphered,len);
             score = scoreTextQgram(deciphered,len);
             dF = score - maxscore;
             if (dF >= 0){
                 maxscore = score;
                 strcpy(maxKey,testKey);
+                memcpy(maxPos,testPos,26*sizeof(int));
             }else if(T > 0){
                 prob = exp(dF/T);
                 if(prob > 1.0*rand()/RAND_MAX){
                     maxscore = score;
-                    strcpy(maxKey,testKey);                
+                    strcpy(maxKey,testKey);
+                    memcpy(maxPos,testPos,26*sizeof(int));
                 }
             }
             // keep track of best score we have seen so far
@@ -139,54 +212,61 @@ float playfairCrack(char *text,int len, char* bestKey){
 }
 
 
-char *playfairDecipher(char *key, char *text, char *result, int len){
-    int i;
-    char a,b; /* the digram we are looking at */
+/* plainPos[25*p + q] holds the key square positions that the ciphertext digram at positions
+   p, q deciphers to. The geometry does not depend on the key, so it is worked out once for all
+   625 position pairs and deciphering a digram is two table lookups. */
+static unsigned char plainPos[625][2];
+static int plainPosReady = 0;
+
+static void buildPlainPos(void){
     int a_ind,b_ind;
     int a_row,b_row;
     int a_col,b_col;
-    
-    for (i = 0; i < len; i += 2){
-        a = text[i];
-        b = text[i+1];
-        /*if (index(key,a) == NULL || index(key,b) == NULL) break;*/
-        a_ind = (int)(strchr(key,a) - key);
-        b_ind = (int)(strchr(key,b) - key);
-        a_row = a_ind / 5;
-        b_row = b_ind / 5;
-        a_col = a_ind % 5;
-        b_col = b_ind % 5;
-        if(a_row == b_row){
-            if(a_col == 0){
-                result[i] = key[a_ind + 4];
-                result[i+1] = key[b_ind - 1];
-            }else if(b_col == 0){
-                result[i] = key[a_ind - 1];
-                result[i+1] = key[b_ind + 4];
-            }else{
-                result[i] = key[a_ind - 1];
-                result[i+1] = key[b_ind - 1];
-            }
-        }else if(a_col == b_col){
-            if(a_row == 0){
-                result[i] = key[a_ind + 20];
-                result[i+1] = key[b_ind - 5];
-            }else if(b_row == 0){
-                result[i] = key[a_ind - 5];
-                result[i+1] = key[b_ind + 20];
+    unsigned char *out;
+
+    for (a_ind = 0; a_ind < 25; a_ind++){
+        for (b_ind = 0; b_ind < 25; b_ind++){
+            out = plainPos[25*a_ind + b_ind];
+            a_row = a_ind / 5;
+            b_row = b_ind / 5;
+            a_col = a_ind % 5;
+            b_col = b_ind % 5;
+            if(a_row == b_row){
+                out[0] = 5*a_row + (a_col + 4) % 5;
+                out[1] = 5*b_row + (b_col + 4) % 5;
+            }else if(a_col == b_col){
+                out[0] = 5*((a_row + 4) % 5) + a_col;
+                out[1] = 5*((b_row + 4) % 5) + b_col;
             }else{
-                result[i] = key[a_ind - 5];
-                result[i+1] = key[b_ind - 5];
+                out[0] = 5*a_row + b_col;
+                out[1] = 5*b_row + a_col;
             }
-        }else{
-            result[i] = key[5*a_row + b_col];
-            result[i+1] = key[5*b_row + a_col];
         }
     }
+    plainPosReady = 1;
+}
+
+/* decipher with the position table pos of key (see keyPositions) */
+char *playfairDecipherPos(char *key, int *pos, char *text, char *result, int len){
+    int i;
+    unsigned char *out;
+
+    if(!plainPosReady) buildPlainPos();
+    for (i = 0; i < len; i += 2){
+        out = plainPos[25*pos[text[i] - 'A'] + pos[text[i+1] - 'A']];
+        result[i] = key[out[0]];
+        result[i+1] = key[out[1]];
+    }
     result[i] = '\0';
     return result;
 }
 
+char *playfairDecipher(char *key, char *text, char *result, int len){
+    int pos[26];
+    keyPositions(key,pos);
+    return playfairDecipherPos(key,pos,text,result,len);
+}
+
 // do fisher yeates shuffle      
 static char *shuffleKey(char *in){
     int i,j;
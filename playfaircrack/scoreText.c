@@ -1,8 +1,52 @@
+#include <string.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 #include "scoreText.h"
+#ifdef BUILTIN_QGRAM
+// built with -DBUILTIN_QGRAM and the quadgram table qgr.h from practicalcryptography.com
 #include "qgr.h"
 
 extern float qgram[];
 
+// quadgram table in use: the compiled-in qgram[] until scoreLoadModel switches it
+static float *qgramTable = qgram;
+#else
+// default build: scoreLoadModel must be called before scoring
+static float *qgramTable = NULL;
+#endif
+
+/* use the quadgram table of a model file written by fitness/English_Fitness.py (NgramModel.save).
+   the file is memory-mapped, so processes loading the same model share one copy of it.
+   header: "NGRM", uint32 version 1, uint32 order, float64 x 2, then float32 tables for k = 1..order.
+   returns 0 on success, -1 if the file cannot be mapped or is not a model of order 4 or more. */
+int scoreLoadModel(const char *path){
+    const long headerSize = 28;
+    const long qgramOffset = headerSize + 4L*(26 + 676 + 17576);
+    struct stat st;
+    unsigned int version, order;
+    char *map;
+    int fd = open(path, O_RDONLY);
+
+    if(fd < 0) return -1;
+    if(fstat(fd, &st) < 0 || st.st_size < qgramOffset + 4L*456976){
+        close(fd);
+        return -1;
+    }
+    map = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd);
+    if(map == MAP_FAILED) return -1;
+    memcpy(&version, map + 4, 4);
+    memcpy(&order, map + 8, 4);
+    if(memcmp(map, "NGRM", 4) != 0 || version != 1 || order < 4){
+        munmap(map, st.st_size);
+        return -1;
+    }
+    qgramTable = (float *)(map + qgramOffset);
+    return 0;
+}
+
 // assumes that text consists only of uppercase letters(no punctuation or spaces)
 double scoreTextQgram(char *text,int len){
     int i;
@@ -14,7 +58,7 @@ double scoreTextQgram(char *text,int len){
         temp[2]=text[i+2]-'A';
         temp[3]=text[i+3]-'A';
         // we have to index into the correct part of the array
-        score += qgram[17576*temp[0] + 676*temp[1] + 26*temp[2] + temp[3]];
+        score += qgramTable[17576*temp[0] + 676*temp[1] + 26*temp[2] + temp[3]];
     }
     return score;
 }
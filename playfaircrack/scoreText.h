@@ -1 +1,2 @@
 double scoreTextQgram(char *text,int len);
+int scoreLoadModel(const char *path);